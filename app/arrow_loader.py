@@ -0,0 +1,172 @@
+# app/arrow_loader.py
+"""
+Mongo cursor → Arrow record batches → Arrow-backed pandas frames.
+
+Documents are consumed one cursor batch at a time and transposed straight
+into typed Arrow arrays with a fixed schema (Mongo names are mapped to the
+scheduler's snake_case names here), so there is no list-of-all-dicts, no
+intermediate object DataFrame and no astype("string") passes. The result
+uses pd.ArrowDtype columns (strings, lists, numbers) and numpy
+datetime64[ns] for start/end, which is what _normalize_shifts_df expects:
+it recognises these dtypes and leaves them alone.
+"""
+from __future__ import annotations
+
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# (output column, source field(s) in priority order, arrow type)
+SHIFT_FIELDS: List[Tuple[str, Tuple[str, ...], pa.DataType]] = [
+    ("id", ("id", "_id"), pa.string()),
+    ("date", ("date",), pa.string()),
+    ("team", ("team", "teamId"), pa.string()),
+    ("role", ("role",), pa.string()),
+    ("assigned_id", ("assignedEmployeeId",), pa.string()),
+    ("assigned_name", ("assignedEmployeeName",), pa.string()),
+    ("start", ("start",), pa.timestamp("ns")),
+    ("end", ("end",), pa.timestamp("ns")),
+    ("hours", ("hours",), pa.float64()),
+    ("version", ("version",), pa.int64()),
+    ("skillsRequired", ("skillsRequired",), pa.list_(pa.string())),
+]
+
+EMPLOYEE_FIELDS: List[Tuple[str, Tuple[str, ...], pa.DataType]] = [
+    ("id", ("id",), pa.string()),
+    ("name", ("name",), pa.string()),
+    ("teamId", ("teamId",), pa.string()),
+    ("role", ("role",), pa.string()),
+    ("skills", ("skills",), pa.list_(pa.string())),
+    ("maxHoursPerWeek", ("maxHoursPerWeek",), pa.int64()),
+]
+
+SHIFT_SCHEMA = pa.schema([(name, typ) for name, _, typ in SHIFT_FIELDS])
+EMPLOYEE_SCHEMA = pa.schema([(name, typ) for name, _, typ in EMPLOYEE_FIELDS])
+
+DEFAULT_BATCH_SIZE = 10_000
+
+
+def _projection(fields) -> Dict[str, int]:
+    proj = {src: 1 for _, sources, _ in fields for src in sources}
+    proj.setdefault("_id", 0)
+    return proj
+
+
+def _pick(doc: Dict[str, Any], sources: Tuple[str, ...]) -> Any:
+    for src in sources:
+        v = doc.get(src)
+        if v is not None:
+            return v
+    return None
+
+
+def _string_array(values: List[Any]) -> pa.Array:
+    out = []
+    for v in values:
+        if v is None or isinstance(v, str):
+            out.append(v)
+        elif isinstance(v, datetime):
+            out.append(v.date().isoformat())
+        elif isinstance(v, date):
+            out.append(v.isoformat())
+        else:
+            out.append(str(v))  # ObjectId, ints used as ids
+    return pa.array(out, type=pa.string())
+
+
+def _timestamp_array(values: List[Any]) -> pa.Array:
+    """BSON dates pass through; ISO strings are parsed by Arrow (pandas fallback for offsets)."""
+    if all(v is None or isinstance(v, datetime) for v in values):
+        return pa.array([v.replace(tzinfo=None) if v is not None else None for v in values], type=pa.timestamp("ns"))
+    strings = pa.array([v if v is None or isinstance(v, str) else v.isoformat() for v in values], type=pa.string())
+    try:
+        return pc.cast(strings, pa.timestamp("ns"))
+    except pa.ArrowInvalid:
+        parsed = pd.to_datetime(pd.Series(strings.to_pylist()), errors="coerce", utc=True, format="ISO8601")
+        return pa.array(parsed.dt.tz_localize(None), type=pa.timestamp("ns"))
+
+
+def _number_array(values: List[Any], typ: pa.DataType) -> pa.Array:
+    out = []
+    for v in values:
+        try:
+            out.append(None if v is None else (int(v) if pa.types.is_integer(typ) else float(v)))
+        except (TypeError, ValueError):
+            out.append(None)
+    return pa.array(out, type=typ)
+
+
+def _list_array(values: List[Any]) -> pa.Array:
+    out = []
+    for v in values:
+        if v is None:
+            out.append(None)
+        elif isinstance(v, str):
+            out.append([v])
+        else:
+            out.append([str(x) for x in v if x is not None])
+    return pa.array(out, type=pa.list_(pa.string()))
+
+
+def _to_record_batch(docs: List[Dict[str, Any]], fields, schema: pa.Schema) -> pa.RecordBatch:
+    arrays = []
+    for _, sources, typ in fields:
+        values = [_pick(d, sources) for d in docs]
+        if pa.types.is_string(typ):
+            arrays.append(_string_array(values))
+        elif pa.types.is_timestamp(typ):
+            arrays.append(_timestamp_array(values))
+        elif pa.types.is_list(typ):
+            arrays.append(_list_array(values))
+        else:
+            arrays.append(_number_array(values, typ))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def iter_record_batches(
+    docs: Iterable[Dict[str, Any]], fields, schema: pa.Schema, batch_size: int = DEFAULT_BATCH_SIZE
+) -> Iterator[pa.RecordBatch]:
+    """Transpose any document iterator (e.g. a pymongo cursor) into record batches."""
+    buf: List[Dict[str, Any]] = []
+    for doc in docs:
+        buf.append(doc)
+        if len(buf) >= batch_size:
+            yield _to_record_batch(buf, fields, schema)
+            buf = []
+    if buf:
+        yield _to_record_batch(buf, fields, schema)
+
+
+def _types_mapper(typ: pa.DataType):
+    # Timestamps convert to numpy datetime64[ns] (what the interval index reads); rest stays Arrow
+    return None if pa.types.is_timestamp(typ) else pd.ArrowDtype(typ)
+
+
+def table_to_frame(table: pa.Table) -> pd.DataFrame:
+    return table.to_pandas(types_mapper=_types_mapper, split_blocks=True, self_destruct=True)
+
+
+def docs_to_frame(docs: Iterable[Dict[str, Any]], fields, schema: pa.Schema, batch_size: int = DEFAULT_BATCH_SIZE) -> pd.DataFrame:
+    table = pa.Table.from_batches(list(iter_record_batches(docs, fields, schema, batch_size)), schema=schema)
+    return table_to_frame(table)
+
+
+def _cursor(collection, query, fields, batch_size) -> Iterable[Dict[str, Any]]:
+    # Plain iterables of documents are accepted too (tests, benchmarks, empty fallbacks)
+    if hasattr(collection, "find"):
+        return collection.find(query or {}, _projection(fields), batch_size=batch_size)
+    return collection
+
+
+def load_shifts(collection, query: Optional[Dict[str, Any]] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> pd.DataFrame:
+    """Shifts matching `query` as an Arrow-backed frame in the scheduler's column layout."""
+    docs = _cursor(collection, query, SHIFT_FIELDS, batch_size)
+    return docs_to_frame(docs, SHIFT_FIELDS, SHIFT_SCHEMA, batch_size)
+
+
+def load_employees(collection, query: Optional[Dict[str, Any]] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> pd.DataFrame:
+    docs = _cursor(collection, query, EMPLOYEE_FIELDS, batch_size)
+    return docs_to_frame(docs, EMPLOYEE_FIELDS, EMPLOYEE_SCHEMA, batch_size)
@@ -0,0 +1,112 @@
+# app/bench_loader.py
+"""
+Load-path benchmark: Mongo-style documents → normalized scheduler frame.
+
+Compares the previous path (list(cursor) → object DataFrame → renames →
+astype passes) with app.arrow_loader. Each variant runs in its own
+subprocess so peak RSS is not polluted by the other; documents are produced
+lazily, like a cursor, so only what the loader keeps is measured.
+
+Run: python -m app.bench_loader --docs 1000000
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator
+
+import pandas as pd
+
+from app.scheduler import _normalize_shifts_df
+
+SKILLS = ["icu", "peds", "er", "python", "react", "k8s", "db", "ci"]
+
+
+def iter_shift_docs(n: int, n_employees: int = 1_000) -> Iterator[Dict[str, Any]]:
+    base = datetime(2025, 1, 6)
+    for i in range(n):
+        start = base + timedelta(days=i % 365, hours=20 if i % 3 == 0 else 9)
+        emp = i % n_employees if i % 5 else None
+        yield {
+            "_id": f"oid-{i:08d}",
+            "id": f"shift-{i}",
+            "date": start.date().isoformat(),
+            "start": start,
+            "end": start + timedelta(hours=8),
+            "team": f"team-{i % 20}",
+            "role": "nurse" if i % 2 else "engineer",
+            "assignedEmployeeId": f"emp-{emp:05d}" if emp is not None else None,
+            "assignedEmployeeName": f"Employee {emp}" if emp is not None else None,
+            "skillsRequired": [SKILLS[i % len(SKILLS)]],
+            "version": 0,
+        }
+
+
+def _legacy(n: int) -> pd.DataFrame:
+    sh_df = pd.DataFrame(list(iter_shift_docs(n)))
+    sh_df.rename(columns={"assignedEmployeeId": "assigned_id", "assignedEmployeeName": "assigned_name"}, inplace=True)
+    oid = sh_df.pop("_id").astype(str)
+    sh_df["id"] = sh_df["id"].where(sh_df["id"].notna(), oid)
+    sh_df["hours"] = None
+    for c in ["id", "team", "role", "assigned_id", "assigned_name"]:
+        sh_df[c] = sh_df[c].astype("string").where(sh_df[c].notna(), None)
+    sh_df["date"] = sh_df["date"].astype(str)
+    return sh_df
+
+
+def _arrow(n: int) -> pd.DataFrame:
+    from app.arrow_loader import load_shifts
+
+    return load_shifts(iter_shift_docs(n))
+
+
+def _child(variant: str, n: int) -> None:
+    t0 = time.perf_counter()
+    raw = (_arrow if variant == "arrow" else _legacy)(n)
+    t_load = time.perf_counter() - t0
+    norm = _normalize_shifts_df(raw)
+    t_total = time.perf_counter() - t0
+    print(
+        json.dumps(
+            {
+                "variant": variant,
+                "rows": len(norm),
+                "load_s": round(t_load, 2),
+                "load_normalize_s": round(t_total, 2),
+                "frame_mb": round(norm.memory_usage(deep=True).sum() / 2**20, 1),
+                # ru_maxrss is KiB on Linux
+                "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            }
+        )
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", type=int, default=1_000_000)
+    ap.add_argument("--variant", choices=["legacy", "arrow"], help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.variant:
+        _child(args.variant, args.docs)
+        return
+
+    for variant in ("legacy", "arrow"):
+        out = subprocess.run(
+            [sys.executable, "-m", "app.bench_loader", "--docs", str(args.docs), "--variant", variant],
+            capture_output=True, text=True, check=True,
+        )
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(
+            f"{r['variant']:<8} rows={r['rows']:>9}  load {r['load_s']:6.2f}s  load+normalize {r['load_normalize_s']:6.2f}s"
+            f"  frame {r['frame_mb']:8.1f} MB  peak RSS {r['peak_rss_mb']:8.1f} MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# app/bench_scheduler.py
+"""
+Synthetic scheduler benchmark (no Mongo needed).
+Run: python -m app.bench_scheduler --shifts 100000 --employees 1000
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from app import metrics
+from app.roster import generate_roster
+from app.scheduler import PTOIntervalIndex, ShiftIntervalIndex, SkillIndex, _assigned_hours_by, _normalize_shifts_df, propose_plan
+
+SKILLS = ["icu", "peds", "er", "python", "react", "k8s", "db", "ci"]
+
+
+def make_shifts(n_shifts: int, n_employees: int, seed: int = 7) -> pd.DataFrame:
+    """Day (09-17) and night (20-08) shifts spread over enough days for n_shifts."""
+    rng = random.Random(seed)
+    base = date(2025, 1, 6)
+    days = max(1, n_shifts // max(1, n_employees // 2))
+    rows = []
+    for i in range(n_shifts):
+        day = base + timedelta(days=i % days)
+        night = i % 3 == 0
+        start = datetime.combine(day, datetime.min.time()) + timedelta(hours=20 if night else 9)
+        end = start + timedelta(hours=12 if night else 8)
+        emp = f"emp-{rng.randrange(n_employees):05d}" if rng.random() < 0.8 else None
+        rows.append(
+            {
+                "date": day.isoformat(),
+                "start": start.isoformat(),
+                "end": end.isoformat(),
+                "team": f"team-{i % 20}",
+                "role": "nurse" if night else "engineer",
+                "assignedEmployeeId": emp,
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def make_employees(n_employees: int, seed: int = 5) -> pd.DataFrame:
+    rng = random.Random(seed)
+    return pd.DataFrame(
+        [
+            {
+                "id": f"emp-{i:05d}",
+                "name": f"Employee {i}",
+                "teamId": f"team-{i % 20}",
+                "role": "nurse" if i % 2 else "engineer",
+                "skills": rng.sample(SKILLS, 3),
+                "maxHoursPerWeek": 40,
+            }
+            for i in range(n_employees)
+        ]
+    )
+
+
+def _timed(label: str, fn):
+    t0 = time.perf_counter()
+    out = fn()
+    print(f"{label:<32} {(time.perf_counter() - t0) * 1000:10.1f} ms")
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--shifts", type=int, default=100_000)
+    ap.add_argument("--employees", type=int, default=1_000)
+    ap.add_argument("--queries", type=int, default=100_000)
+    ap.add_argument("--plans", type=int, default=5, help="propose_plan runs per metrics on/off pass")
+    ap.add_argument("--roster-shifts", type=int, default=10_000, help="open shifts for the roster run")
+    args = ap.parse_args()
+
+    raw = _timed("generate", lambda: make_shifts(args.shifts, args.employees))
+    sh_df = _timed("normalize", lambda: _normalize_shifts_df(raw))
+    index = _timed("build interval index", lambda: ShiftIntervalIndex.from_shifts(sh_df))
+    _timed("weekly hours", lambda: _assigned_hours_by(sh_df, "week"))
+    _timed("month-to-date hours", lambda: _assigned_hours_by(sh_df, "month"))
+
+    rng = random.Random(11)
+    probes = sh_df.sample(n=min(args.queries, len(sh_df)), replace=True, random_state=3)
+    emps = [f"emp-{rng.randrange(args.employees):05d}" for _ in range(len(probes))]
+    pairs = list(zip(emps, probes["start"], probes["end"]))
+
+    def _probe():
+        return sum(index.conflicts(e, s, t, 12) for e, s, t in pairs)
+
+    t0 = time.perf_counter()
+    hits = _probe()
+    dt = time.perf_counter() - t0
+    print(f"{'rest/overlap probes':<32} {dt * 1000:10.1f} ms  ({dt / len(pairs) * 1e6:.2f} µs/probe, {hits} conflicts)")
+
+    emp_df = make_employees(args.employees)
+    skills = _timed("build skill index", lambda: SkillIndex.from_employees(emp_df))
+    asks = [(rng.choice(["nurse", "engineer"]), rng.sample(SKILLS, 2), f"team-{rng.randrange(20)}") for _ in range(10_000)]
+    t0 = time.perf_counter()
+    matched = sum(sum(1 for _ in SkillIndex.members(skills.match(r, sk, team=t))) for r, sk, t in asks)
+    dt = time.perf_counter() - t0
+    print(f"{'skill matches':<32} {dt * 1000:10.1f} ms  ({dt / len(asks) * 1e6:.2f} µs/match, {matched} candidates)")
+
+    # PTO overlap queries against a year of requests
+    base = date(2025, 1, 1)
+    requests = []
+    for i in range(args.employees * 12):
+        s = base + timedelta(days=rng.randrange(365))
+        requests.append(
+            {
+                "id": f"pto-{i}",
+                "employeeId": f"emp-{i % args.employees:05d}",
+                "teamId": f"team-{i % 20}",
+                "start": s.isoformat(),
+                "end": (s + timedelta(days=rng.randrange(14))).isoformat(),
+                "status": "approved",
+            }
+        )
+    pto = _timed("build PTO index", lambda: PTOIntervalIndex.from_requests(requests))
+    windows = [(base + timedelta(days=rng.randrange(365)), f"team-{rng.randrange(20)}") for _ in range(10_000)]
+    t0 = time.perf_counter()
+    overlaps = sum(len(pto.overlapping(d, d + timedelta(days=4), team=t)) for d, t in windows)
+    dt = time.perf_counter() - t0
+    print(f"{'PTO overlap queries':<32} {dt * 1000:10.1f} ms  ({dt / len(windows) * 1e6:.2f} µs/query, {overlaps} overlaps)")
+
+    # Planner end-to-end, with and without instrumentation (interleaved to cancel drift)
+    busy = raw[raw["assignedEmployeeId"].notna()].iloc[0]
+    kwargs = dict(
+        pto_emp_id=busy["assignedEmployeeId"],
+        pto_dates=sorted(raw["date"].unique())[:14],
+        role_needed=busy["role"],
+        team_needed=busy["team"],
+    )
+    timings = {True: [], False: []}
+    for _ in range(args.plans):
+        for on in (False, True):
+            metrics.set_enabled(on)
+            t0 = time.perf_counter()
+            propose_plan(employees_df=emp_df, shifts_df=raw, **kwargs)
+            timings[on].append(time.perf_counter() - t0)
+    metrics.set_enabled(True)
+    off, on = min(timings[False]), min(timings[True])
+    print(f"{'propose_plan (metrics off)':<32} {off * 1000:10.1f} ms")
+    print(f"{'propose_plan (metrics on)':<32} {on * 1000:10.1f} ms  (overhead {(on - off) / off * 100:+.2f}%)")
+
+    # Roster generation: every shift open, all teams
+    open_shifts = make_shifts(args.roster_shifts, args.employees)
+    open_shifts["assignedEmployeeId"] = None
+    open_shifts["id"] = [f"shift-{i}" for i in range(len(open_shifts))]
+    roster = _timed(
+        "generate_roster",
+        lambda: generate_roster(
+            emp_df, open_shifts, open_shifts["date"].min(), open_shifts["date"].max(), allow_cross_team=True
+        ),
+    )
+    print(f"{'':<32} {roster['stats']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,23 @@
 # app/call_gemini.py
 import os
+import time
 import requests
 from dotenv import load_dotenv
 
+from app.metrics import LLM_ERRORS, LLM_LATENCY, traced
+
 load_dotenv()
 
 API_BASE = os.getenv("GEMINI_API_URL") or "https://generativelanguage.googleapis.com/v1beta"
 API_KEY  = os.getenv("GEMINI_API_KEY")
 MODEL    = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
 
-if not API_KEY or not API_BASE:
-    raise RuntimeError("GEMINI_API_KEY or GEMINI_API_URL not set in environment (.env)")
-
+@traced("gemini.generateContent")
 def call_gemini(prompt: str, temperature: float = 0.2, max_output_tokens: int = 256):
     """Call Gemini (AI Studio) using API key and generateContent endpoint."""
+    # Checked per call, not at import, so callers with a fallback (summarize_hr_note) keep working without a key
+    if not API_KEY or not API_BASE:
+        raise RuntimeError("GEMINI_API_KEY or GEMINI_API_URL not set in environment (.env)")
     url = f"{API_BASE}/models/{MODEL}:generateContent?key={API_KEY}"
     payload = {
         "contents": [
@@ -27,12 +31,32 @@ def call_gemini(prompt: str, temperature: float = 0.2, max_output_tokens: int =
         }
     }
     headers = {"Content-Type": "application/json"}
-    resp = requests.post(url, json=payload, headers=headers, timeout=30)
-    resp.raise_for_status()
-    data = resp.json()
+    t0 = time.perf_counter()
+    try:
+        resp = requests.post(url, json=payload, headers=headers, timeout=30)
+        resp.raise_for_status()
+        data = resp.json()
+    except Exception as e:
+        LLM_LATENCY.observe(time.perf_counter() - t0, model=MODEL, status="error")
+        LLM_ERRORS.inc(model=MODEL, kind=type(e).__name__)
+        raise
+    LLM_LATENCY.observe(time.perf_counter() - t0, model=MODEL, status="ok")
 
     # Extract first text candidate safely
     try:
         return data["candidates"][0]["content"]["parts"][0]["text"]
     except Exception:
         return data  # return raw if structure differs
+
+def summarize_hr_note(employee_name: str, start, end, outcome: str) -> str:
+    """One-paragraph HR note for a PTO decision; falls back to a plain sentence if Gemini fails."""
+    fallback = f"PTO for {employee_name} from {start} to {end}: {outcome}."
+    prompt = (
+        "Write a short, friendly HR note (2 sentences max) for a manager about this PTO request.\n"
+        f"Employee: {employee_name}\nDates: {start} to {end}\nOutcome: {outcome}"
+    )
+    try:
+        out = call_gemini(prompt, temperature=0.2, max_output_tokens=128)
+    except Exception:
+        return fallback
+    return out.strip() if isinstance(out, str) and out.strip() else fallback
@@ -2,21 +2,35 @@
 from __future__ import annotations
 
 import os
-from typing import Tuple
-from pymongo import MongoClient
+import re
+import threading
+from typing import Any, Dict, Optional, Tuple
+from pymongo import MongoClient, ReadPreference, monitoring
+from pymongo.database import Database
 from pymongo.errors import ServerSelectionTimeoutError
 import certifi
 from dotenv import load_dotenv
 
+from app.metrics import MONGO_LATENCY, register_collector
+
 # Ensure .env variables are loaded
 load_dotenv()
 
-_client: MongoClient | None = None
-_dbname: str | None = None
+# One pooled client per cluster URI, shared by every tenant on that cluster
+_clients: Dict[str, MongoClient] = {}
+_clients_lock = threading.Lock()
+
 
+def _tenant_suffix(tenant: str) -> str:
+    """'unit-east' → 'UNIT_EAST' for per-tenant env overrides."""
+    return re.sub(r"[^A-Za-z0-9]+", "_", tenant).strip("_").upper()
 
-def _mongo_uri() -> str:
-    uri = os.getenv("MONGODB_URI", "").strip()
+
+def _mongo_uri(tenant: Optional[str] = None) -> str:
+    uri = ""
+    if tenant:
+        uri = os.getenv(f"MONGODB_URI_{_tenant_suffix(tenant)}", "").strip()
+    uri = uri or os.getenv("MONGODB_URI", "").strip()
     if not uri:
         # Debug hint: show what env keys exist
         env_keys = [k for k in os.environ.keys() if "MONGO" in k]
@@ -28,42 +42,223 @@ def _mongo_uri() -> str:
     return uri
 
 
-def get_db():
+def _db_name(tenant: Optional[str] = None) -> str:
+    """Default tenant → MONGO_DB; others → MONGO_DB_<TENANT>, else '<MONGO_DB>_<tenant>' ('unit.east' → 'herashift_unit_east')."""
+    base = os.getenv("MONGO_DB", "herashift")
+    if not tenant:
+        return base
+    suffix = _tenant_suffix(tenant)
+    # Same sanitising as the env overrides, so any tenant id yields a valid database name
+    return os.getenv(f"MONGO_DB_{suffix}", "").strip() or f"{base}_{suffix.lower()}"
+
+
+def _int_env(key: str, default: int) -> int:
+    raw = os.getenv(key, "").strip()
+    return int(raw) if raw else default
+
+
+def _client_options() -> Dict[str, Any]:
+    """Pool sizes/timeouts from env; defaults match the original single-client settings."""
+    timeout_ms = _int_env("MONGO_TIMEOUT_MS", 20000)
+    opts: Dict[str, Any] = {
+        "maxPoolSize": _int_env("MONGO_MAX_POOL_SIZE", 100),
+        "minPoolSize": _int_env("MONGO_MIN_POOL_SIZE", 0),
+        "maxIdleTimeMS": _int_env("MONGO_MAX_IDLE_MS", 0) or None,
+        "waitQueueTimeoutMS": _int_env("MONGO_WAIT_QUEUE_TIMEOUT_MS", 0) or None,
+        "serverSelectionTimeoutMS": timeout_ms,
+        "connectTimeoutMS": timeout_ms,
+        "socketTimeoutMS": timeout_ms,
+    }
+    if os.getenv("MONGO_TLS", "true").strip().lower() not in ("0", "false", "no"):
+        opts.update(tls=True, tlsCAFile=certifi.where())
+    return opts
+
+
+# ---------- pool metrics ----------
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool counters per server address (thread-safe)."""
+
+    _FIELDS = ("open", "in_use", "max_in_use", "checkouts", "checkout_failures", "pool_clears")
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _bump(self, address: Tuple[str, int], field: str, delta: int = 1) -> None:
+        key = f"{address[0]}:{address[1]}"
+        with self._lock:
+            s = self._stats.setdefault(key, dict.fromkeys(self._FIELDS, 0))
+            s[field] += delta
+            if field == "in_use":
+                s["max_in_use"] = max(s["max_in_use"], s["in_use"])
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {k: dict(v) for k, v in self._stats.items()}
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._bump(event.address, "pool_clears")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._bump(event.address, "open")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._bump(event.address, "open", -1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._bump(event.address, "checkout_failures")
+
+    def connection_checked_out(self, event):
+        self._bump(event.address, "checkouts")
+        self._bump(event.address, "in_use")
+
+    def connection_checked_in(self, event):
+        self._bump(event.address, "in_use", -1)
+
+
+pool_metrics = PoolMetrics()
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Feeds every command's server round-trip time into herashift_mongo_command_seconds."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_LATENCY.observe(event.duration_micros / 1e6, command=event.command_name, status="ok")
+
+    def failed(self, event):
+        MONGO_LATENCY.observe(event.duration_micros / 1e6, command=event.command_name, status="error")
+
+
+command_metrics = CommandMetrics()
+
+
+def _pool_gauges():
+    lines = []
+    for field in ("open", "in_use", "max_in_use"):
+        name = f"herashift_mongo_pool_{field}"
+        lines += [f"# HELP {name} Connection pool {field.replace('_', ' ')} per server.", f"# TYPE {name} gauge"]
+        for server, s in sorted(pool_metrics.snapshot().items()):
+            lines.append(f'{name}{{server="{server}"}} {s[field]}')
+    return lines
+
+
+register_collector(_pool_gauges)
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Pool usage for every registered cluster, plus the configured limits."""
+    opts = _client_options()
+    return {
+        "clients": len(_clients),
+        "maxPoolSize": opts["maxPoolSize"],
+        "minPoolSize": opts["minPoolSize"],
+        "servers": pool_metrics.snapshot(),
+    }
+
+
+# ---------- client registry ----------
+def get_client(tenant: Optional[str] = None) -> MongoClient:
     """
-    Returns a live DB handle with TLS using certifi.
+    Returns the pooled client for the tenant's cluster, creating it on first use.
     Raises RuntimeError if the connection fails.
     """
-    global _client, _dbname
-    if _client is None:
-        uri = _mongo_uri()
-        _dbname = os.getenv("MONGO_DB", "herashift")
-        _client = MongoClient(
-            uri,
-            tls=True,
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=20000,
-            connectTimeoutMS=20000,
-            socketTimeoutMS=20000,
-        )
+    uri = _mongo_uri(tenant)
+    client = _clients.get(uri)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _clients.get(uri)
+        if client is not None:
+            return client
+        client = MongoClient(uri, event_listeners=[pool_metrics, command_metrics], **_client_options())
         try:
-            _client.admin.command("ping")
+            client.admin.command("ping")
         except ServerSelectionTimeoutError as e:
-            _client = None
+            client.close()
             raise RuntimeError(
                 "❌ Cannot reach MongoDB. TLS handshake or network blocked.\n"
                 "• Check internet/VPN/firewall.\n"
                 "• Verify MONGODB_URI in your .env.\n"
                 f"Underlying error: {e}"
             ) from e
-    return _client[_dbname]
+        _clients[uri] = client
+        return client
+
+
+def get_db(tenant: Optional[str] = None) -> Database:
+    """
+    Returns a live DB handle on the primary (writes, plan application).
+    Raises RuntimeError if the connection fails.
+    """
+    return get_client(tenant).get_database(_db_name(tenant))
+
+
+def get_read_db(tenant: Optional[str] = None) -> Database:
+    """
+    Same database with readPreference=secondaryPreferred, for heavy reads
+    (dashboard loads, aggregations) that tolerate replication lag.
+    """
+    return get_client(tenant).get_database(
+        _db_name(tenant), read_preference=ReadPreference.SECONDARY_PREFERRED
+    )
+
+
+def ensure_indexes(database: Database) -> None:
+    """
+    Idempotent; safe to call on every startup. Called from API startup and the
+    seed script rather than at import, so a failure (e.g. duplicate ids blocking
+    the unique pto_requests.id index the 409 path depends on) is visible.
+    """
+    database["employees"].create_index("id")
+    database["shifts"].create_index("id")
+    database["shifts"].create_index([("assignedEmployeeId", 1), ("date", 1)])
+    database["shifts"].create_index([("team", 1), ("role", 1), ("date", 1)])
+    database["pto_requests"].create_index("id", unique=True)
+    # Work queue: workers claim the oldest queued request
+    database["pto_requests"].create_index([("planStatus", 1), ("createdAt", 1)])
+    # Overlap queries: status equality, then start <= hi / end >= lo
+    database["pto_requests"].create_index([("status", 1), ("start", 1), ("end", 1)])
+    database["coverage_forecasts"].create_index([("teamId", 1), ("date", 1)])
+
+
+def close_all() -> None:
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
 
 
-# Convenience collections
+# Convenience collections (default tenant)
 try:
     db = get_db()
+    read_db = get_read_db()
     employees = db["employees"]
     shifts = db["shifts"]
+    pto_requests = db["pto_requests"]
+    coverage_forecasts = db["coverage_forecasts"]
 except Exception:
     db = None
+    read_db = None
     employees = None
     shifts = None
+    pto_requests = None
+    coverage_forecasts = None
@@ -0,0 +1,345 @@
+# app/loadtest.py
+"""
+Load test for the FastAPI service with local stand-ins.
+
+Boots app.main in-process (httpx ASGI transport, no network hop) against
+mongomock or a local mongod, with in-process planning workers and a stub
+Gemini server that injects latency. N virtual users then loop over
+
+    POST /request-pto → POST /propose-schedule → GET /heatmap
+
+for a fixed duration. Reported per endpoint: p50/p95/p99 latency,
+throughput and errors; plus queue→done latency of the planning jobs.
+Each run is saved as JSON (config, git revision, results) so runs of
+different versions can be compared with --compare.
+
+Run:
+  python -m app.loadtest --concurrency 32 --duration 30
+  python -m app.loadtest --mongodb-uri mongodb://localhost:27017 --compare loadtest_results/<baseline>.json
+  # Out-of-process server: start the stub, point the server at it, drive by URL
+  python -m app.loadtest --stub-only --stub-port 8765
+  GEMINI_API_URL=http://127.0.0.1:8765 GEMINI_API_KEY=x uvicorn app.main:app
+  python -m app.loadtest --url http://127.0.0.1:8000 --mongodb-uri mongodb://localhost:27017 --db herashift
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_OUT_DIR = Path("loadtest_results")
+ENDPOINTS = ("POST /request-pto", "POST /propose-schedule", "GET /heatmap")
+
+
+# ---------- stub Gemini ----------
+def start_stub_gemini(
+    port: int = 0, latency_ms: float = 300, jitter_ms: float = 100, error_rate: float = 0.0
+) -> ThreadingHTTPServer:
+    """generateContent look-alike on 127.0.0.1 that sleeps latency ± jitter before answering."""
+    rng = random.Random(17)
+    lock = threading.Lock()
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            with lock:
+                delay = max(0.0, latency_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000
+                fail = rng.random() < error_rate
+            time.sleep(delay)
+            if fail:
+                self.send_response(503)
+                self.end_headers()
+                return
+            body = json.dumps(
+                {"candidates": [{"content": {"parts": [{"text": "Coverage arranged; enjoy the time off."}]}}]}
+            ).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-gemini", daemon=True).start()
+    return server
+
+
+# ---------- data ----------
+def seed(database, n_employees: int, days: int, start: date, shifts_per_group: int = 2) -> List[Dict[str, Any]]:
+    """Wipe + seed employees and assigned day shifts (team/role groups as in bench_scheduler)."""
+    from app.bench_scheduler import make_employees
+
+    emps = make_employees(n_employees).to_dict("records")
+    groups: Dict[tuple, List[str]] = {}
+    for e in emps:
+        groups.setdefault((e["teamId"], e["role"]), []).append(e["id"])
+
+    shifts = []
+    for k in range(days):
+        d = start + timedelta(days=k)
+        day_start = datetime.combine(d, datetime.min.time()) + timedelta(hours=9)
+        for (team, role), members in groups.items():
+            for j in range(shifts_per_group):
+                shifts.append(
+                    {
+                        "id": f"shift-{d.isoformat()}-{team}-{role}-{j}",
+                        "date": d.isoformat(),
+                        "start": day_start,
+                        "end": day_start + timedelta(hours=8),
+                        "team": team,
+                        "role": role,
+                        "assignedEmployeeId": members[(k * shifts_per_group + j) % len(members)],
+                        "version": 0,
+                    }
+                )
+    for name in ("employees", "shifts", "pto_requests", "coverage_forecasts", "plan_results"):
+        database[name].delete_many({})
+    database["employees"].insert_many([dict(e) for e in emps])
+    database["shifts"].insert_many(shifts)
+    return emps
+
+
+# ---------- driver ----------
+def _percentiles(samples: List[float]) -> Dict[str, Optional[float]]:
+    if not samples:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {
+        "p50_ms": round(p50 * 1000, 2),
+        "p95_ms": round(p95 * 1000, 2),
+        "p99_ms": round(p99 * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2),
+    }
+
+
+async def _drive(
+    client, employees: List[Dict[str, Any]], concurrency: int, duration_s: float, horizon: date, run_id: str, seed_: int
+) -> Dict[str, Any]:
+    latencies: Dict[str, List[float]] = {k: [] for k in ENDPOINTS}
+    errors: Dict[str, int] = {k: 0 for k in ENDPOINTS}
+    submitted: List[str] = []
+    deadline = time.perf_counter() + duration_s
+
+    async def _call(name: str, method: str, url: str, **kw) -> bool:
+        t0 = time.perf_counter()
+        try:
+            resp = await client.request(method, url, **kw)
+            ok = resp.status_code < 400
+        except Exception:
+            ok = False
+        if ok:
+            latencies[name].append(time.perf_counter() - t0)
+        else:
+            errors[name] += 1
+        return ok
+
+    async def _user(u: int) -> None:
+        rng = random.Random(seed_ * 1000 + u)
+        n = 0
+        while time.perf_counter() < deadline:
+            emp = rng.choice(employees)
+            start = horizon + timedelta(days=rng.randrange(14))
+            req_id = f"{run_id}-{u}-{n}"
+            n += 1
+            body = {
+                "id": req_id,
+                "employeeId": emp["id"],
+                "start": start.isoformat(),
+                "end": (start + timedelta(days=rng.randrange(3))).isoformat(),
+            }
+            if await _call("POST /request-pto", "POST", "/request-pto", json=body):
+                if await _call("POST /propose-schedule", "POST", "/propose-schedule", params={"request_id": req_id}):
+                    submitted.append(req_id)
+            await _call("GET /heatmap", "GET", "/heatmap", params={"team_id": emp["teamId"], "day": start.isoformat()})
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_user(u) for u in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+
+    endpoints = {}
+    for name in ENDPOINTS:
+        ok = len(latencies[name])
+        endpoints[name] = {
+            "requests": ok + errors[name],
+            "errors": errors[name],
+            "throughput_rps": round(ok / elapsed, 2),
+            **_percentiles(latencies[name]),
+        }
+    total_ok = sum(len(v) for v in latencies.values())
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(total_ok / elapsed, 2),
+        "endpoints": endpoints,
+        "submitted": submitted,
+    }
+
+
+def _job_stats(pto_col, request_ids: List[str], drain_timeout_s: float) -> Dict[str, Any]:
+    """Wait for queued jobs to finish, then queue→done latency from the request documents."""
+    t_end = time.perf_counter() + drain_timeout_s
+    pending = {"id": {"$in": request_ids}, "planStatus": {"$in": ["queued", "planning"]}}
+    while request_ids and time.perf_counter() < t_end and pto_col.count_documents(pending):
+        time.sleep(0.25)
+    durations, failed, unfinished = [], 0, 0
+    for d in pto_col.find({"id": {"$in": request_ids}}, {"planStatus": 1, "queuedAt": 1, "finishedAt": 1}):
+        if d.get("planStatus") == "done" and d.get("queuedAt") and d.get("finishedAt"):
+            durations.append((d["finishedAt"] - d["queuedAt"]).total_seconds())
+        elif d.get("planStatus") == "failed":
+            failed += 1
+        else:
+            unfinished += 1
+    return {"jobs": len(request_ids), "done": len(durations), "failed": failed, "unfinished": unfinished, **_percentiles(durations)}
+
+
+# ---------- results ----------
+def _git_rev() -> str:
+    repo = Path(__file__).resolve().parents[1]
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo, capture_output=True, text=True, check=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "app"], cwd=repo, capture_output=True, text=True).stdout.strip()
+        return out.stdout.strip() + ("-dirty" if dirty else "")
+    except Exception:
+        return "unknown"
+
+
+def save_results(result: Dict[str, Any], out_dir: Path) -> Path:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / f"{result['started_at'].replace(':', '').replace('-', '')[:15]}-{result['git_rev']}.json"
+    path.write_text(json.dumps(result, indent=2))
+    return path
+
+
+def print_report(result: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> None:
+    print(f"run {result['git_rev']}  concurrency={result['config']['concurrency']}  {result['elapsed_s']}s  "
+          f"{result['throughput_rps']} req/s")
+    print(f"{'endpoint':<26} {'reqs':>7} {'err':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = dict(result["endpoints"], **{"planning job (queue→done)": result["jobs"]})
+    for name, r in rows.items():
+        line = (f"{name:<26} {r.get('requests', r.get('jobs')):>7} {r.get('errors', r.get('failed')):>5} "
+                f"{r.get('throughput_rps', ''):>8} {r['p50_ms'] or '-':>9} {r['p95_ms'] or '-':>9} {r['p99_ms'] or '-':>9}")
+        print(line)
+        base = baseline and dict(baseline["endpoints"], **{"planning job (queue→done)": baseline["jobs"]}).get(name)
+        if base:
+            deltas = []
+            for key in ("p50_ms", "p95_ms", "p99_ms"):
+                if base.get(key) and r.get(key):
+                    deltas.append(f"{key[:3]} {(r[key] - base[key]) / base[key] * 100:+.1f}%")
+            if deltas:
+                print(f"{'':<26}   vs {baseline['git_rev']}: " + ", ".join(deltas))
+    if result["jobs"]["unfinished"]:
+        print(f"{result['jobs']['unfinished']} planning job(s) still queued after the drain timeout")
+
+
+# ---------- entry point ----------
+def _prepare_backend(args) -> Any:
+    """Point app.db at mongomock or the given mongod before app.main is imported."""
+    if args.mongodb_uri:
+        os.environ.update(MONGODB_URI=args.mongodb_uri, MONGO_DB=args.db)
+        os.environ.setdefault("MONGO_TLS", "false")
+        from app.db import get_db
+
+        return get_db()
+
+    import mongomock
+
+    os.environ["MONGODB_URI"] = ""  # never let a .env point the run at a real cluster
+    import app.db as db_mod
+
+    database = mongomock.MongoClient()[args.db]
+    db_mod.db, db_mod.read_db = database, database
+    for name in ("employees", "shifts", "pto_requests", "coverage_forecasts"):
+        setattr(db_mod, name, database[name])
+    db_mod.ensure_indexes(database)
+    return database
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--duration", type=float, default=20.0, help="seconds of load")
+    ap.add_argument("--employees", type=int, default=200)
+    ap.add_argument("--days", type=int, default=28, help="seeded shift horizon")
+    ap.add_argument("--workers", type=int, default=2, help="in-process planning workers")
+    ap.add_argument("--mongodb-uri", default="", help="local mongod (default: mongomock)")
+    ap.add_argument("--db", default="herashift_loadtest", help="database to wipe + seed")
+    ap.add_argument("--no-seed", action="store_true")
+    ap.add_argument("--url", default="", help="drive an already running server instead of booting one")
+    ap.add_argument("--llm-latency-ms", type=float, default=300)
+    ap.add_argument("--llm-jitter-ms", type=float, default=100)
+    ap.add_argument("--llm-error-rate", type=float, default=0.0)
+    ap.add_argument("--stub-only", action="store_true", help="only run the stub Gemini server")
+    ap.add_argument("--stub-port", type=int, default=0)
+    ap.add_argument("--drain-timeout", type=float, default=60.0, help="seconds to wait for queued jobs")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out-dir", default=str(DEFAULT_OUT_DIR))
+    ap.add_argument("--compare", default="", help="baseline result JSON to diff against")
+    args = ap.parse_args()
+
+    stub = start_stub_gemini(args.stub_port, args.llm_latency_ms, args.llm_jitter_ms, args.llm_error_rate)
+    stub_url = f"http://127.0.0.1:{stub.server_address[1]}"
+    if args.stub_only:
+        print(f"Stub Gemini on {stub_url} (GEMINI_API_URL={stub_url}). Ctrl+C to stop.")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            return
+    os.environ.update(GEMINI_API_URL=stub_url, GEMINI_API_KEY="loadtest")
+
+    import httpx
+
+    if args.url and not args.mongodb_uri:
+        raise SystemExit("--url needs --mongodb-uri (the server's database) to seed and read job outcomes")
+    database = _prepare_backend(args)
+    horizon = date.today()
+    if args.no_seed:
+        employees = list(database["employees"].find({}, {"_id": 0, "id": 1, "teamId": 1}))
+    else:
+        employees = seed(database, args.employees, args.days, horizon - timedelta(days=7))
+
+    stop = threading.Event()
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+    else:
+        from app.main import app
+        from app.pto_worker import start_workers
+
+        start_workers(database, args.workers, stop)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=60)
+
+    started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    run_id = f"lt{int(time.time())}"
+
+    async def _run():
+        async with client:
+            return await _drive(client, employees, args.concurrency, args.duration, horizon, run_id, args.seed)
+
+    driven = asyncio.run(_run())
+    jobs = _job_stats(database["pto_requests"], driven.pop("submitted"), args.drain_timeout)
+    stop.set()
+    stub.shutdown()
+
+    config = {k: v for k, v in vars(args).items() if k not in ("compare", "out_dir", "stub_only", "stub_port")}
+    config["backend"] = "url" if args.url else ("mongod" if args.mongodb_uri else "mongomock")
+    result = {"started_at": started_at, "git_rev": _git_rev(), "config": config, **driven, "jobs": jobs}
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    print_report(result, baseline)
+    print(f"saved {save_results(result, Path(args.out_dir))}")
+
+
+if __name__ == "__main__":
+    main()
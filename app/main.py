@@ -1,13 +1,41 @@
-from fastapi import FastAPI, HTTPException
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import date
-from .db import employees, shifts, pto_requests, coverage_forecasts
-from .models import PTORequest, PTOPlanResponse, ScheduleOption
-from .scheduler import propose_options
-from .call_gemini import summarize_hr_note
-from .azure_forecast import forecast_risk
+from fastapi.responses import PlainTextResponse
+from pymongo.errors import DuplicateKeyError
+from .db import db, employees, ensure_indexes, pto_requests, read_db
+from .metrics import HTTP_LATENCY, render as render_metrics, span
+from .models import PTORequest, PTOPlanResponse, PlanJob, ScheduleOption
+from .pto_worker import enqueue, start_workers
+
+log = logging.getLogger(__name__)
+
+# In-process planning workers; set PTO_WORKERS=0 when running `python -m app.pto_worker` separately
+_workers_stop = threading.Event()
+
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    if db is not None:
+        try:
+            ensure_indexes(db)
+        except Exception as e:
+            # Read-only users can still run the app, but duplicate PTO ids will no longer 409
+            log.warning("ensure_indexes failed: %s", e)
+        count = int(os.getenv("PTO_WORKERS", "2"))
+        if count > 0:
+            start_workers(db, count, _workers_stop)
+    yield
+    _workers_stop.set()
 
-app = FastAPI(title="HeraShift API")
+
+app = FastAPI(title="HeraShift API", lifespan=_lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -15,57 +43,80 @@ app.add_middleware(
     allow_methods=["*"], allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def _observe_latency(request: Request, call_next):
+    t0 = time.perf_counter()
+    status = 500
+    # The route is only known after routing, so the span is renamed once call_next returns
+    with span(f"{request.method} unmatched") as sp:
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            # Route template (e.g. /jobs/{job_id}) keeps label and span-name cardinality bounded
+            route = getattr(request.scope.get("route"), "path", "unmatched")
+            if sp is not None:
+                sp.update_name(f"{request.method} {route}")
+                sp.set_attribute("http.route", route)
+                sp.set_attribute("http.status_code", status)
+            HTTP_LATENCY.observe(time.perf_counter() - t0, method=request.method, route=route, status=str(status))
+
+
 @app.get("/")
 def root():
     return {"ok": True, "service": "HeraShift"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.post("/request-pto", response_model=PTORequest)
 def request_pto(req: PTORequest):
     emp = employees.find_one({"id": req.employeeId})
     if not emp:
         raise HTTPException(status_code=404, detail="Employee not found")
+    if req.end < req.start:
+        raise HTTPException(status_code=422, detail="end must not be before start")
     rec = req.dict()
-    pto_requests.insert_one(rec)
+    # Dates as ISO strings sort correctly for the range queries; teamId places the request in the team's PTO index
+    rec["start"], rec["end"] = req.start.isoformat(), req.end.isoformat()
+    rec["teamId"] = emp.get("teamId")
+    rec["createdAt"] = datetime.now(timezone.utc)
+    try:
+        pto_requests.insert_one(rec)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="PTO request id already exists")
     return req
 
-@app.post("/propose-schedule", response_model=PTOPlanResponse)
+@app.post("/propose-schedule", response_model=PlanJob, status_code=202)
 def propose_schedule(request_id: str):
-    req = pto_requests.find_one({"id": request_id})
+    """Queue the request for a background worker; poll /jobs/{jobId} for the outcome."""
+    req = enqueue(pto_requests, request_id)
     if not req:
         raise HTTPException(status_code=404, detail="PTO request not found")
+    return PlanJob(jobId=request_id, status=req.get("planStatus", "queued"))
 
-    emp = employees.find_one({"id": req["employeeId"]})
-    if not emp:
-        raise HTTPException(status_code=404, detail="Employee not found")
-
-    start = date.fromisoformat(str(req["start"]))
-    end = date.fromisoformat(str(req["end"]))
-
-    options = propose_options(emp, start, end)
-    best = max(options, key=lambda x: x["coverageScore"])
-    approved = best["coverageScore"] >= 0.6
-
-    note = summarize_hr_note(emp["name"], best["start"], best["end"],
-                             f"{'Approved' if approved else 'Needs change'} (coverage {best['coverageScore']})")
-
-    cov = forecast_risk(emp["teamId"], start)
-    coverage_forecasts.update_one(
-        {"teamId": cov["teamId"], "date": cov["date"]},
-        {"$set": cov}, upsert=True
-    )
-
-    status = "approved" if approved else "pending"
-    pto_requests.update_one({"id": request_id}, {"$set": {"status": status}})
+@app.get("/jobs/{job_id}", response_model=PlanJob)
+def job_status(job_id: str):
+    req = pto_requests.find_one({"id": job_id}, {"_id": 0, "planStatus": 1, "result": 1, "error": 1})
+    if not req:
+        raise HTTPException(status_code=404, detail="Job not found")
 
-    chosen = ScheduleOption(**best)
-    return PTOPlanResponse(
-        requestId=request_id,
-        approved=approved,
-        chosenOption=chosen,
-        message=note
-    )
+    job = PlanJob(jobId=job_id, status=req.get("planStatus") or "new", error=req.get("error"))
+    res = req.get("result")
+    if job.status == "done" and res:
+        job.result = PTOPlanResponse(
+            requestId=job_id,
+            approved=res["approved"],
+            chosenOption=ScheduleOption(**res["chosenOption"]),
+            message=res["message"],
+        )
+        job.plan = res.get("plan", [])
+        job.conflicts = res.get("conflicts", [])
+    return job
 
 @app.get("/heatmap")
 def heatmap(team_id: str, day: str):
-    rec = coverage_forecasts.find_one({"teamId": team_id, "date": day})
+    rec = read_db["coverage_forecasts"].find_one({"teamId": team_id, "date": day}, {"_id": 0})
     return rec or {"teamId": team_id, "date": day, "riskScore": None}
@@ -0,0 +1,174 @@
+# app/metrics.py
+"""
+Minimal Prometheus-style metrics (text exposition format) + optional tracing.
+
+No client library needed: counters/histograms are plain dicts behind a lock,
+rendered by render() for GET /metrics. If `opentelemetry-api` is installed,
+span() also opens an OpenTelemetry span (a no-op until an SDK/exporter is
+configured). Set HERASHIFT_METRICS=0 to turn everything into no-ops.
+"""
+from __future__ import annotations
+
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+try:
+    from opentelemetry import trace as _otel_trace
+except ImportError:  # tracing is optional
+    _otel_trace = None
+
+ENABLED = os.getenv("HERASHIFT_METRICS", "1").strip().lower() not in ("0", "false", "no")
+
+# Seconds; covers sub-ms Mongo commands up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_LabelKey = Tuple[str, ...]
+
+
+def set_enabled(on: bool) -> None:
+    global ENABLED
+    ENABLED = bool(on)
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values: Dict[_LabelKey, float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if not ENABLED:
+            return
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, v in sorted(self._values.items()):
+                lines.append(f"{self.name}{_fmt_labels(self.labelnames, key)} {v:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[_LabelKey, list] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels: str) -> None:
+        if not ENABLED:
+            return
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            s[0][i] += 1
+            s[1] += value
+            s[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, n) in sorted(self._series.items()):
+                cum = 0
+                for b, c in zip(self.buckets + (float("inf"),), counts):
+                    cum += c
+                    le = "+Inf" if b == float("inf") else f"{b:g}"
+                    labels = _fmt_labels(self.labelnames, key, 'le="%s"' % le)
+                    lines.append(f"{self.name}_bucket{labels} {cum}")
+                lines.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {total:.6f}")
+                lines.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {n}")
+        return lines
+
+
+REGISTRY: List = []
+# Extra gauge sources (e.g. Mongo pool stats), each returning exposition lines
+_COLLECTORS: List[Callable[[], List[str]]] = []
+
+
+def register_collector(fn: Callable[[], List[str]]) -> None:
+    _COLLECTORS.append(fn)
+
+
+def render() -> str:
+    lines: List[str] = []
+    for m in REGISTRY:
+        lines.extend(m.render())
+    for fn in _COLLECTORS:
+        try:
+            lines.extend(fn())
+        except Exception:
+            pass
+    return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[object]:
+    """OpenTelemetry span when the API is installed and metrics are on; otherwise a no-op."""
+    if not ENABLED or _otel_trace is None:
+        yield None
+        return
+    with _otel_trace.get_tracer("herashift").start_as_current_span(name, attributes=attributes) as sp:
+        yield sp
+
+
+def traced(name: str):
+    """Decorator form of span()."""
+
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return deco
+
+
+# ---------- metric definitions ----------
+HTTP_LATENCY = Histogram(
+    "herashift_http_request_seconds", "FastAPI request latency by route.", ("method", "route", "status")
+)
+PLAN_LATENCY = Histogram("herashift_plan_seconds", "propose_plan wall time.", ("objective",))
+PLAN_CANDIDATES = Counter(
+    "herashift_plan_candidates_total", "Candidates evaluated / found viable by propose_plan.", ("stage",)
+)
+PLAN_SHIFTS = Counter("herashift_plan_shifts_total", "Target shifts seen by propose_plan.", ("outcome",))
+ROSTER_LATENCY = Histogram("herashift_roster_seconds", "generate_roster wall time.", ("objective",))
+ROSTER_SHIFTS = Counter("herashift_roster_shifts_total", "Open shifts seen by generate_roster.", ("outcome",))
+MONGO_LATENCY = Histogram("herashift_mongo_command_seconds", "MongoDB command latency.", ("command", "status"))
+LLM_LATENCY = Histogram("herashift_llm_request_seconds", "Gemini generateContent latency.", ("model", "status"))
+LLM_ERRORS = Counter("herashift_llm_errors_total", "Failed Gemini calls.", ("model", "kind"))
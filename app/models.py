@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from typing import List, Optional
-from datetime import date
+from datetime import date, datetime
 
 class Employee(BaseModel):
     id: str
@@ -15,7 +15,12 @@ class Shift(BaseModel):
     date: date
     teamId: str
     roleNeeded: str
+    start: Optional[datetime] = None  # defaults to 09:00 on `date` when omitted
+    end: Optional[datetime] = None
+    hours: Optional[float] = None  # defaults to end - start, else 8
+    skillsRequired: List[str] = []
     assignedEmployeeId: Optional[str] = None
+    version: int = 0  # bumped on every assignment write (optimistic locking)
 
 class PTORequest(BaseModel):
     id: str
@@ -34,3 +39,11 @@ class PTOPlanResponse(BaseModel):
     approved: bool
     chosenOption: Optional[ScheduleOption] = None
     message: str
+
+class PlanJob(BaseModel):
+    jobId: str
+    status: str  # new/queued/planning/done/failed
+    error: Optional[str] = None
+    result: Optional[PTOPlanResponse] = None
+    plan: List[dict] = []
+    conflicts: List[dict] = []
@@ -0,0 +1,330 @@
+# app/plan_apply.py
+"""
+Concurrency-safe plan application.
+
+Every shift carries a `version` that is bumped on each assignment write.
+apply_plan() re-reads the shifts and the chosen employees' current
+assignments, re-validates weekly caps / double-booking / rest against that
+fresh state, and writes all surviving rows in one unordered bulk_write whose
+filters are conditional on the version the planner saw.
+
+On a replica set the whole thing runs in a transaction that first bumps a
+`scheduleVersion` on each chosen employee, so two coordinators assigning
+the same person serialize (the loser retries and re-validates).
+
+Without transactions (standalone server) each chosen employee's
+`scheduleVersion` works as a seqlock: it is read before the shifts, and
+between validation and the shift writes one conditional bulk update moves
+it from the even value read to odd (locked, tagged with a token); it goes
+back to even once the writes are done. A coordinator whose guard did not
+match, or that read a locked employee, loses that employee's rows, so caps
+and double-booking across different shifts are still checked at write time.
+Locks left by a crashed coordinator expire after APPLY_LOCK_LEASE_S.
+
+Round trips are constant in the number of rows.
+"""
+from __future__ import annotations
+
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.collection import Collection
+from pymongo.errors import ConfigurationError, OperationFailure
+
+from app.scheduler import (
+    ShiftIntervalIndex,
+    _assigned_hours_by,
+    _exceeds_daily_max,
+    _iso_to_date,
+    _normalize_shifts_df,
+    _violates_rest,
+    _week_start,
+)
+
+# Server error code for "Transaction numbers are only allowed on a replica set member or mongos"
+_ILLEGAL_OPERATION = 20
+APPLY_LOCK_LEASE_S = int(os.getenv("APPLY_LOCK_LEASE_S", "60"))
+
+
+def _shift_key_filter(shift_id: str) -> Dict[str, Any]:
+    """Shifts are addressed by app-level `id`, falling back to Mongo `_id`."""
+    if ObjectId.is_valid(shift_id):
+        return {"$or": [{"id": shift_id}, {"_id": ObjectId(shift_id)}]}
+    return {"id": shift_id}
+
+
+def _version_filter(version: int) -> Dict[str, Any]:
+    # Legacy documents have no version field: treat missing as 0
+    return {"version": version} if version else {"version": {"$in": [0, None]}}
+
+
+def _doc_key(doc: Dict[str, Any]) -> str:
+    return str(doc["id"]) if doc.get("id") is not None else str(doc.get("_id"))
+
+
+def _read_state(
+    shifts_col: Collection,
+    employees_col: Collection,
+    rows: List[Dict[str, Any]],
+    session=None,
+) -> Tuple[Dict[str, Dict[str, Any]], pd.DataFrame, Dict[str, Dict[str, Any]]]:
+    """One find for the chosen employees (caps + guard versions), one for targeted shifts + nearby assignments."""
+    ids = [r["shift_id"] for r in rows]
+    chosen = sorted({r["assigned_employee_id"] for r in rows})
+    # Employees first: every guard version read here predates the shift state read below
+    employees = {
+        str(e["id"]): e
+        for e in employees_col.find(
+            {"id": {"$in": chosen}},
+            {"_id": 0, "id": 1, "maxHoursPerWeek": 1, "scheduleVersion": 1, "scheduleLockToken": 1, "scheduleLockedAt": 1},
+            session=session,
+        )
+    }
+    days = [_iso_to_date(r["date"]) for r in rows]
+    # Whole weeks for caps, plus a day either side for rest across week boundaries
+    lo = (_week_start(min(days)) - timedelta(days=1)).isoformat()
+    hi = (_week_start(max(days)) + timedelta(days=7)).isoformat()
+
+    oids = [ObjectId(i) for i in ids if ObjectId.is_valid(i)]
+    query = {
+        "$or": [
+            {"id": {"$in": ids}},
+            {"_id": {"$in": oids}},
+            {"assignedEmployeeId": {"$in": chosen}, "date": {"$gte": lo, "$lte": hi}},
+        ]
+    }
+    docs = list(shifts_col.find(query, session=session))
+    wanted = set(ids)
+    targets = {_doc_key(d): d for d in docs if _doc_key(d) in wanted}
+    others = [d for d in docs if _doc_key(d) not in wanted]
+    for d in others:
+        d.pop("_id", None)
+    current = pd.DataFrame(others) if others else pd.DataFrame(columns=["date", "assignedEmployeeId"])
+    return targets, current, employees
+
+
+def _locked(emp: Dict[str, Any]) -> bool:
+    """Odd scheduleVersion: another coordinator is between its guard and its writes (unless the lease ran out)."""
+    if int(emp.get("scheduleVersion") or 0) % 2 == 0:
+        return False
+    at = emp.get("scheduleLockedAt")
+    if at is None:
+        return False
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)  # pymongo hands back naive UTC by default
+    return at > datetime.now(timezone.utc) - timedelta(seconds=APPLY_LOCK_LEASE_S)
+
+
+def _acquire(employees_col: Collection, employees: Dict[str, Dict[str, Any]], chosen: List[str], token: str) -> set:
+    """
+    One conditional bulk update: each employee moves from the version read to a
+    locked (odd) one tagged with `token`. Returns the ids this call now holds.
+    """
+    if not chosen:
+        return set()
+    now = datetime.now(timezone.utc)
+    ops = []
+    for e in chosen:
+        v = int(employees[e].get("scheduleVersion") or 0)
+        flt = {"id": e, "scheduleVersion": v} if v else {"id": e, "scheduleVersion": {"$in": [0, None]}}
+        # even → odd; a stale (expired) odd lock is taken over and stays odd
+        locked = v + 1 if v % 2 == 0 else v + 2
+        ops.append(
+            UpdateOne(flt, {"$set": {"scheduleVersion": locked, "scheduleLockToken": token, "scheduleLockedAt": now}})
+        )
+    res = employees_col.bulk_write(ops, ordered=False)
+    if res.matched_count == len(ops):
+        return set(chosen)
+    # Nobody else can overwrite our token while the lock is fresh, so this read is exact
+    return {str(d["id"]) for d in employees_col.find({"id": {"$in": chosen}, "scheduleLockToken": token}, {"id": 1})}
+
+
+def _release(employees_col: Collection, held: set, token: str) -> None:
+    if held:
+        employees_col.update_many(
+            {"id": {"$in": sorted(held)}, "scheduleLockToken": token},
+            {"$inc": {"scheduleVersion": 1}, "$unset": {"scheduleLockToken": "", "scheduleLockedAt": ""}},
+        )
+
+
+def _validate(
+    rows: List[Dict[str, Any]],
+    targets: Dict[str, Dict[str, Any]],
+    current: pd.DataFrame,
+    caps: Dict[str, Optional[int]],
+    weekly_cap: int,
+    hours_per_shift: int,
+    min_rest_hours: int,
+    max_daily_hours: Optional[int],
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Split rows into (accepted, lost) against the state just read."""
+    sh_df = _normalize_shifts_df(current, hours_per_shift=hours_per_shift)
+    index = ShiftIntervalIndex.from_shifts(sh_df)
+    wk_hours = _assigned_hours_by(sh_df, "week")
+    target_df = _normalize_shifts_df(pd.DataFrame(list(targets.values())), hours_per_shift=hours_per_shift)
+    target_df.index = [_doc_key(d) for d in targets.values()]
+
+    accepted: List[Dict[str, Any]] = []
+    lost: List[Dict[str, Any]] = []
+    for r in rows:
+        doc = targets.get(r["shift_id"])
+        if doc is None:
+            lost.append({**r, "reason": "shift no longer exists"})
+            continue
+        if int(doc.get("version") or 0) != int(r.get("version") or 0):
+            lost.append({**r, "reason": "shift changed since planning"})
+            continue
+
+        emp = r["assigned_employee_id"]
+        t = target_df.loc[r["shift_id"]]
+        start, end, hours = t["start"], t["end"], float(t["hours"])
+        if _exceeds_daily_max(index, emp, r["date"], hours, max_daily_hours) or _violates_rest(
+            index, emp, start, end, min_rest_hours
+        ):
+            lost.append({**r, "reason": "employee double-booked or short on rest"})
+            continue
+
+        wk = _week_start(_iso_to_date(r["date"])).isoformat()
+        cap = min(int(weekly_cap), int(caps.get(emp) or weekly_cap))
+        if wk_hours.get((emp, wk), 0) + hours > cap:
+            lost.append({**r, "reason": "weekly cap exceeded"})
+            continue
+
+        accepted.append(r)
+        if pd.notna(start) and pd.notna(end):
+            index.add(emp, start, end, r["date"], hours)
+        wk_hours[(emp, wk)] = wk_hours.get((emp, wk), 0) + hours
+    return accepted, lost
+
+
+def _write(
+    shifts_col: Collection,
+    accepted: List[Dict[str, Any]],
+    names: Dict[str, str],
+    session=None,
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Conditional bulk write; only re-reads to find losers when something didn't match."""
+    if not accepted:
+        return [], []
+    ops = [
+        UpdateOne(
+            {**_shift_key_filter(r["shift_id"]), **_version_filter(int(r.get("version") or 0))},
+            {
+                "$set": {
+                    "assignedEmployeeId": r["assigned_employee_id"],
+                    "assignedEmployeeName": names.get(r["assigned_employee_id"], ""),
+                },
+                "$inc": {"version": 1},
+            },
+        )
+        for r in accepted
+    ]
+    res = shifts_col.bulk_write(ops, ordered=False, session=session)
+    if res.matched_count == len(ops):
+        return accepted, []
+
+    ids = [r["shift_id"] for r in accepted]
+    oids = [ObjectId(i) for i in ids if ObjectId.is_valid(i)]
+    after = {
+        _doc_key(d): d
+        for d in shifts_col.find(
+            {"$or": [{"id": {"$in": ids}}, {"_id": {"$in": oids}}]},
+            {"id": 1, "assignedEmployeeId": 1, "version": 1},
+            session=session,
+        )
+    }
+    won, lost = [], []
+    for r in accepted:
+        d = after.get(r["shift_id"], {})
+        if d.get("assignedEmployeeId") == r["assigned_employee_id"] and int(d.get("version") or 0) == int(r.get("version") or 0) + 1:
+            won.append(r)
+        else:
+            lost.append({**r, "reason": "shift changed since planning"})
+    return won, lost
+
+
+def apply_plan(
+    shifts_col: Collection,
+    plan_rows: List[Dict[str, Any]],
+    employee_names: Optional[Dict[str, str]] = None,
+    weekly_cap: int = 40,
+    hours_per_shift: int = 8,
+    min_rest_hours: int = 12,
+    max_daily_hours: Optional[int] = None,
+    employees_col: Optional[Collection] = None,
+    use_transaction: Optional[bool] = None,
+) -> Dict[str, Any]:
+    """
+    Apply propose_plan() rows atomically per shift.
+    Returns {"applied": [...], "lost": [{...row, "reason"}], "transaction": bool}.
+    Lost rows should be re-planned. use_transaction=None tries a transaction
+    and falls back to the per-employee guard on servers without one.
+    """
+    employees_col = employees_col if employees_col is not None else shifts_col.database["employees"]
+    names = employee_names or {}
+
+    rows = [r for r in plan_rows if r.get("shift_id")]
+    lost: List[Dict[str, Any]] = [{**r, "reason": "shift has no id"} for r in plan_rows if not r.get("shift_id")]
+    if not rows:
+        return {"applied": [], "lost": lost, "transaction": False}
+
+    def _caps(employees: Dict[str, Dict[str, Any]]) -> Dict[str, Optional[int]]:
+        return {e: doc.get("maxHoursPerWeek") for e, doc in employees.items()}
+
+    def _run_transaction(session) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        # Write-lock every chosen employee first: concurrent plans touching the same
+        # person now conflict, and with_transaction retries the loser on fresh state.
+        # +2 keeps the version even, i.e. unlocked for coordinators without transactions.
+        chosen = sorted({r["assigned_employee_id"] for r in rows})
+        employees_col.update_many({"id": {"$in": chosen}}, {"$inc": {"scheduleVersion": 2}}, session=session)
+        targets, current, employees = _read_state(shifts_col, employees_col, rows, session=session)
+        accepted, rejected = _validate(
+            rows, targets, current, _caps(employees), weekly_cap, hours_per_shift, min_rest_hours, max_daily_hours
+        )
+        won, raced = _write(shifts_col, accepted, names, session=session)
+        return won, rejected + raced
+
+    def _run_guarded() -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        targets, current, employees = _read_state(shifts_col, employees_col, rows)
+        busy = {e for e in {r["assigned_employee_id"] for r in rows} if e not in employees or _locked(employees[e])}
+        rejected = [
+            {**r, "reason": "employee not found" if r["assigned_employee_id"] not in employees
+             else "employee schedule is being updated"}
+            for r in rows if r["assigned_employee_id"] in busy
+        ]
+        candidates = [r for r in rows if r["assigned_employee_id"] not in busy]
+        accepted, invalid = _validate(
+            candidates, targets, current, _caps(employees), weekly_cap, hours_per_shift, min_rest_hours, max_daily_hours
+        )
+        token = uuid.uuid4().hex
+        held = _acquire(employees_col, employees, sorted({r["assigned_employee_id"] for r in accepted}), token)
+        try:
+            guarded = [r for r in accepted if r["assigned_employee_id"] in held]
+            raced = [
+                {**r, "reason": "employee schedule changed since planning"}
+                for r in accepted if r["assigned_employee_id"] not in held
+            ]
+            won, lost_writes = _write(shifts_col, guarded, names)
+        finally:
+            _release(employees_col, held, token)
+        return won, rejected + invalid + raced + lost_writes
+
+    if use_transaction is not False:
+        try:
+            with shifts_col.database.client.start_session() as session:
+                won, rejected = session.with_transaction(_run_transaction)
+            return {"applied": won, "lost": lost + rejected, "transaction": True}
+        except (NotImplementedError, ConfigurationError):
+            if use_transaction:
+                raise
+        except OperationFailure as e:
+            if use_transaction or e.code != _ILLEGAL_OPERATION:
+                raise
+
+    won, rejected = _run_guarded()
+    return {"applied": won, "lost": lost + rejected, "transaction": False}
@@ -0,0 +1,216 @@
+# app/plan_store.py
+"""
+Memoized propose_plan results.
+
+Key = sha1(planner parameters + fingerprint of the data the plan depends on):
+the team/role's shifts and every same-role employee's assignments inside the
+window the planner looks at (month start / week start → a week past the last
+PTO day), plus those employees' roster rows. Any change to that slice changes
+the key, so a hit is always current; changes elsewhere leave entries valid.
+
+Entries live in a bounded in-process LRU and, when a collection is given, in
+Mongo (bounded by evicting least-recently-used documents).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.scheduler import PTOIntervalIndex, _iso_to_date, _week_start
+
+
+def plan_window(dates: Iterable[str]) -> Tuple[str, str]:
+    """Dates whose shifts can influence a plan for `dates` (caps, month-to-date, rest)."""
+    days = [_iso_to_date(d) for d in dates]
+    first, last = min(days), max(days)
+    lo = min(_week_start(first), first.replace(day=1)) - timedelta(days=1)
+    hi = _week_start(last) + timedelta(days=7)
+    return lo.isoformat(), hi.isoformat()
+
+
+def _cell_text(v: Any) -> str:
+    if isinstance(v, (list, tuple, np.ndarray)):
+        return "\x1f".join(str(x) for x in v)
+    return str(v)
+
+
+def _text(col: pd.Series) -> pd.Series:
+    # Object and Arrow list columns (e.g. skills) hold sequences, which astype(str) rejects
+    if col.dtype.kind == "O":
+        return col.astype(object).map(_cell_text)
+    return col.astype(str)
+
+
+def _frame_digest(df: pd.DataFrame) -> bytes:
+    if df.empty:
+        return b""
+    cols = sorted(df.columns)
+    hashed = pd.util.hash_pandas_object(pd.DataFrame({c: _text(df[c]) for c in cols}), index=False)
+    return hashlib.sha1(",".join(cols).encode() + hashed.values.tobytes()).digest()
+
+
+def data_fingerprint(emp_df: pd.DataFrame, sh_df: pd.DataFrame, team: str, role: str, dates: List[str]) -> str:
+    """Hash of exactly the shifts/employees a plan for (team, role, dates) reads."""
+    lo, hi = plan_window(dates)
+    team_col = "team" if "team" in sh_df.columns else "teamId"
+    assigned_col = "assigned_id" if "assigned_id" in sh_df.columns else "assignedEmployeeId"
+
+    roster = emp_df[emp_df["role"] == str(role)] if "role" in emp_df.columns else emp_df
+    cand_ids = set(roster["id"].astype(str)) if "id" in roster.columns else set()
+    d = sh_df["date"].astype(str)
+    in_window = (d >= lo) & (d <= hi)
+    relevant = in_window & (
+        ((sh_df[team_col] == str(team)) & (sh_df["role"] == str(role)))
+        | sh_df[assigned_col].astype(str).isin(cand_ids)
+    )
+    h = hashlib.sha1()
+    h.update(_frame_digest(roster))
+    h.update(_frame_digest(sh_df[relevant.fillna(False)]))
+    return h.hexdigest()
+
+
+def _jsonable(obj: Any) -> Any:
+    if isinstance(obj, (date, datetime, pd.Timestamp)):
+        return obj.isoformat()
+    return str(obj)
+
+
+def _bson_cell(v: Any) -> Any:
+    """Arrow list cells come out of astype(object) as ndarrays and numbers as numpy scalars; BSON takes neither."""
+    if isinstance(v, np.ndarray):
+        return v.tolist()
+    if isinstance(v, np.generic):
+        return v.item()
+    return v
+
+
+class PlanStore:
+    """Bounded LRU (+ optional Mongo collection) of propose_plan results."""
+
+    def __init__(self, collection=None, max_entries: int = 256):
+        self.collection = collection
+        self.max_entries = max_entries
+        self._lru: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if collection is not None:
+            collection.create_index("key", unique=True)
+            collection.create_index("lastUsedAt")
+            collection.create_index([("scope.team", 1), ("scope.role", 1)])
+
+    @staticmethod
+    def make_key(params: Dict[str, Any], fingerprint: str) -> str:
+        blob = json.dumps(params, sort_keys=True, default=_jsonable) + "|" + fingerprint
+        return hashlib.sha1(blob.encode()).hexdigest()
+
+    # ----- storage -----
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                self._lru.move_to_end(key)
+                return entry["result"]
+        if self.collection is None:
+            return None
+        doc = self.collection.find_one_and_update(
+            {"key": key}, {"$set": {"lastUsedAt": datetime.now(timezone.utc)}}, projection={"_id": 0}
+        )
+        if doc is None:
+            return None
+        self._remember(key, doc)
+        return doc["result"]
+
+    def put(self, key: str, result: Dict[str, Any], scope: Dict[str, str]) -> None:
+        now = datetime.now(timezone.utc)
+        doc = {"key": key, "result": result, "scope": scope, "createdAt": now, "lastUsedAt": now}
+        self._remember(key, doc)
+        if self.collection is None:
+            return
+        self.collection.replace_one({"key": key}, doc, upsert=True)
+        if self.collection.estimated_document_count() > self.max_entries:
+            # Drop everything older than the max_entries-th most recently used document
+            edge = list(
+                self.collection.find({}, {"lastUsedAt": 1}).sort("lastUsedAt", -1).skip(self.max_entries).limit(1)
+            )
+            if edge:
+                self.collection.delete_many({"lastUsedAt": {"$lte": edge[0]["lastUsedAt"]}})
+
+    def _remember(self, key: str, doc: Dict[str, Any]) -> None:
+        with self._lock:
+            self._lru[key] = doc
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+    def invalidate(self, team: str, role: str, dates: List[str]) -> None:
+        """Drop entries whose window overlaps `dates` for this team/role (e.g. after applying a plan)."""
+        lo, hi = plan_window(dates)
+
+        def _hit(scope: Dict[str, str]) -> bool:
+            return scope["team"] == str(team) and scope["role"] == str(role) and scope["lo"] <= hi and scope["hi"] >= lo
+
+        with self._lock:
+            for k in [k for k, v in self._lru.items() if _hit(v["scope"])]:
+                del self._lru[k]
+        if self.collection is not None:
+            self.collection.delete_many(
+                {"scope.team": str(team), "scope.role": str(role), "scope.lo": {"$lte": hi}, "scope.hi": {"$gte": lo}}
+            )
+
+    # ----- memoized planning -----
+    def get_or_compute(
+        self,
+        params: Dict[str, Any],
+        emp_df: pd.DataFrame,
+        sh_df: pd.DataFrame,
+        compute: Callable[[], Dict[str, Any]],
+        pto_index: Optional[PTOIntervalIndex] = None,
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        params must include team_needed, role_needed and pto_dates.
+        pto_index: the approved PTO the plan excludes; its requests in the window join the key.
+        Returns (result, served_from_cache); result matches propose_plan's shape.
+        """
+        team, role, dates = params["team_needed"], params["role_needed"], list(params["pto_dates"])
+        fingerprint = data_fingerprint(emp_df, sh_df, team, role, dates)
+        if pto_index is not None:
+            fingerprint += "|" + pto_index.digest(min(dates), max(dates))
+        key = self.make_key(params, fingerprint)
+        stored = self.get(key)
+        if stored is not None:
+            self.hits += 1
+            return self._load(stored), True
+
+        self.misses += 1
+        result = compute()
+        lo, hi = plan_window(dates)
+        self.put(key, self._dump(result), {"team": str(team), "role": str(role), "lo": lo, "hi": hi})
+        return result, False
+
+    @staticmethod
+    def _dump(result: Dict[str, Any]) -> Dict[str, Any]:
+        preview = result["preview_shifts_df"].drop(columns=["_day"], errors="ignore")
+        preview = preview.astype(object).where(preview.notna(), None).map(_bson_cell)
+        return {
+            "plan": result["plan"],
+            "conflicts": result["conflicts"],
+            "preview": preview.to_dict("records"),
+            "preview_columns": list(preview.columns),
+        }
+
+    @staticmethod
+    def _load(stored: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "plan": stored["plan"],
+            "conflicts": stored["conflicts"],
+            "preview_shifts_df": pd.DataFrame(stored["preview"], columns=stored["preview_columns"]),
+        }
+
@@ -0,0 +1,229 @@
+# app/pto_worker.py
+"""
+Background planning workers for the PTO request queue.
+
+/propose-schedule only flips a request to planStatus="queued". Workers claim
+the oldest queued request with a single find_one_and_update (so each request
+is planned exactly once), run propose_plan, write the HR note + forecast and
+store the result on the request document.
+
+planStatus: queued → planning → done | failed
+A "planning" claim older than PTO_CLAIM_LEASE_S is considered abandoned
+(worker crashed) and can be claimed again.
+
+Run standalone: python -m app.pto_worker --workers 4
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import socket
+import threading
+import traceback
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+from pymongo import ReturnDocument
+from pymongo.database import Database
+
+from app.arrow_loader import load_employees, load_shifts
+from app.azure_forecast import forecast_risk
+from app.call_gemini import summarize_hr_note
+from app.scheduler import PTOIntervalIndex, _week_start, propose_plan
+
+# Same bar the synchronous endpoint used for auto-approval
+APPROVAL_COVERAGE = 0.6
+# Requests that still take people off the roster (rejected/cancelled ones don't)
+ACTIVE_PTO_STATUSES = ("approved", "pending")
+CLAIM_LEASE_S = int(os.getenv("PTO_CLAIM_LEASE_S", "300"))
+POLL_INTERVAL_S = float(os.getenv("PTO_POLL_INTERVAL_S", "0.5"))
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def enqueue(pto_col, request_id: str) -> Optional[Dict[str, Any]]:
+    """Mark a request for planning (idempotent while queued/planning). Returns the doc or None."""
+    return pto_col.find_one_and_update(
+        {"id": request_id, "planStatus": {"$nin": ["queued", "planning"]}},
+        {"$set": {"planStatus": "queued", "queuedAt": _now()}, "$unset": {"error": ""}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    ) or pto_col.find_one({"id": request_id}, {"_id": 0})
+
+
+def claim_next(pto_col, worker_id: str) -> Optional[Dict[str, Any]]:
+    """Atomically claim the oldest queued (or abandoned) request."""
+    now = _now()
+    return pto_col.find_one_and_update(
+        {
+            "$or": [
+                {"planStatus": "queued"},
+                {"planStatus": "planning", "claimedAt": {"$lt": now - timedelta(seconds=CLAIM_LEASE_S)}},
+            ]
+        },
+        {"$set": {"planStatus": "planning", "claimedAt": now, "workerId": worker_id}, "$inc": {"attempts": 1}},
+        sort=[("createdAt", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def load_planning_frames(database: Database, emp: Dict[str, Any], start: date, end: date) -> Dict[str, pd.DataFrame]:
+    """
+    Indexed fetch of just what the planner needs: same-role employees, and shifts
+    for the team/role or any candidate between the month/week start and a week past `end`.
+    """
+    emp_df = load_employees(database["employees"], {"role": emp["role"]})
+    cand_ids = emp_df["id"].dropna().tolist()
+    lo = (min(_week_start(start), start.replace(day=1)) - timedelta(days=1)).isoformat()
+    hi = (_week_start(end) + timedelta(days=7)).isoformat()
+    window = {"$gte": lo, "$lte": hi}
+    sh_df = load_shifts(
+        database["shifts"],
+        {
+            "$or": [
+                {"team": emp["teamId"], "role": emp["role"], "date": window},
+                {"assignedEmployeeId": {"$in": cand_ids}, "date": window},
+            ]
+        },
+    )
+    return {"employees": emp_df, "shifts": sh_df}
+
+
+def load_pto_index(
+    pto_col, lo: str, hi: str, team_of: Optional[Dict[str, str]] = None, statuses=ACTIVE_PTO_STATUSES
+) -> PTOIntervalIndex:
+    """Every request overlapping [lo, hi] in one range query (served by the status/start/end index)."""
+    docs = pto_col.find(
+        {"status": {"$in": list(statuses)}, "start": {"$lte": hi}, "end": {"$gte": lo}},
+        {"_id": 0, "id": 1, "employeeId": 1, "teamId": 1, "start": 1, "end": 1, "status": 1},
+    )
+    return PTOIntervalIndex.from_requests(docs, team_of=team_of)
+
+
+def _date_range_inclusive(start: date, end: date) -> List[str]:
+    return [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+
+
+def process_request(database: Database, req: Dict[str, Any]) -> Dict[str, Any]:
+    """Plan one PTO request; returns the result stored on the request document."""
+    emp = database["employees"].find_one({"id": req["employeeId"]}, {"_id": 0})
+    if not emp:
+        raise LookupError(f"Employee {req['employeeId']} not found")
+
+    start = date.fromisoformat(str(req["start"])[:10])
+    end = date.fromisoformat(str(req["end"])[:10])
+    frames = load_planning_frames(database, emp, start, end)
+    team_of = dict(zip(frames["employees"]["id"].astype(str), frames["employees"]["teamId"].astype(str)))
+    team_of[emp["id"]] = emp["teamId"]
+    pto_index = load_pto_index(database["pto_requests"], start.isoformat(), end.isoformat(), team_of=team_of)
+    overlapping = [
+        r["id"] for r in pto_index.overlapping(start, end, team=emp["teamId"])
+        if r["id"] != req["id"] and r["employeeId"] != emp["id"]
+    ]
+    result = propose_plan(
+        employees_df=frames["employees"],
+        shifts_df=frames["shifts"],
+        pto_emp_id=emp["id"],
+        pto_dates=_date_range_inclusive(start, end),
+        role_needed=emp["role"],
+        team_needed=emp["teamId"],
+        weekly_cap=int(emp.get("maxHoursPerWeek") or 40),
+        pto_index=pto_index,
+    )
+
+    plan, conflicts = result["plan"], result["conflicts"]
+    total = len(plan) + len(conflicts)
+    coverage = round(len(plan) / total, 2) if total else 1.0
+    approved = coverage >= APPROVAL_COVERAGE
+    note = summarize_hr_note(
+        emp["name"], start.isoformat(), end.isoformat(),
+        f"{'Approved' if approved else 'Needs change'} (coverage {coverage})",
+    )
+
+    cov = forecast_risk(emp["teamId"], start)
+    database["coverage_forecasts"].update_one(
+        {"teamId": cov["teamId"], "date": cov["date"]}, {"$set": cov}, upsert=True
+    )
+    return {
+        "approved": approved,
+        "chosenOption": {"start": start.isoformat(), "end": end.isoformat(), "coverageScore": coverage},
+        "message": note,
+        "plan": plan,
+        "conflicts": conflicts,
+        "overlappingRequests": overlapping,
+    }
+
+
+def run_once(database: Database, worker_id: str) -> bool:
+    """Claim and process one request. Returns False when the queue was empty."""
+    pto_col = database["pto_requests"]
+    req = claim_next(pto_col, worker_id)
+    if req is None:
+        return False
+    # Only the current claimant may write the outcome (a lease may have expired meanwhile)
+    mine = {"id": req["id"], "workerId": worker_id, "planStatus": "planning"}
+    try:
+        result = process_request(database, req)
+    except Exception as e:
+        pto_col.update_one(
+            mine,
+            {"$set": {"planStatus": "failed", "error": f"{type(e).__name__}: {e}", "finishedAt": _now()}},
+        )
+        traceback.print_exc()
+        return True
+    status = "approved" if result["approved"] else "pending"
+    pto_col.update_one(
+        mine,
+        {"$set": {"planStatus": "done", "status": status, "result": result, "finishedAt": _now()}},
+    )
+    return True
+
+
+def worker_loop(database: Database, stop: threading.Event, worker_id: str) -> None:
+    while not stop.is_set():
+        try:
+            busy = run_once(database, worker_id)
+        except Exception:
+            traceback.print_exc()
+            busy = False
+        if not busy:
+            stop.wait(POLL_INTERVAL_S)
+
+
+def start_workers(database: Database, count: int, stop: threading.Event) -> List[threading.Thread]:
+    """Start `count` daemon worker threads sharing the database's connection pool."""
+    host = f"{socket.gethostname()}:{os.getpid()}"
+    threads = []
+    for i in range(count):
+        t = threading.Thread(
+            target=worker_loop, args=(database, stop, f"{host}/{i}"), name=f"pto-worker-{i}", daemon=True
+        )
+        t.start()
+        threads.append(t)
+    return threads
+
+
+def main():
+    from app.db import get_db
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=int(os.getenv("PTO_WORKERS", "2")))
+    ap.add_argument("--tenant", default=None)
+    args = ap.parse_args()
+
+    stop = threading.Event()
+    threads = start_workers(get_db(args.tenant), args.workers, stop)
+    print(f"✅ {len(threads)} PTO planning worker(s) running. Ctrl+C to stop.")
+    try:
+        while any(t.is_alive() for t in threads):
+            for t in threads:
+                t.join(timeout=1.0)
+    except KeyboardInterrupt:
+        stop.set()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,455 @@
+# app/roster.py
+"""
+Roster generation: fill every open shift in a horizon, for all teams, in one run.
+
+Same constraint model as propose_plan (role/team/skills, approved PTO,
+double-booking or max_daily_hours, min rest, weekly caps, objectives):
+
+  1. Static feasibility is one boolean matrix [open shifts x employees]
+     (role, team, skill subset via uint64 bitmasks, PTO), built in chunks.
+  2. Greedy fill, most-constrained shift first. Dynamic limits are dense
+     [week x employee] / [day x employee] hour matrices, so each shift's
+     feasible set is a handful of vector ops; candidates are ranked by the
+     objective and the first one clearing the rest check (ShiftIntervalIndex) wins.
+  3. Local search: repair unfilled shifts by moving one of a blocking
+     employee's new assignments to someone else, then rebalance weekly hours
+     (move a shift to a less-loaded feasible employee) until nothing improves
+     or the time budget runs out.
+
+Only shifts planned in this run are ever moved; existing assignments are fixed.
+Write-back goes through plan_apply.apply_plan (one validated bulk_write).
+
+Run: python -m app.roster --start 2025-01-06 --weeks 4 [--apply]
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.metrics import ROSTER_LATENCY, ROSTER_SHIFTS, traced
+from app.scheduler import (
+    PTOIntervalIndex,
+    ShiftIntervalIndex,
+    _as_skill_set,
+    _assigned_hours_by,
+    _iso_to_date,
+    _normalize_employees_df,
+    _normalize_shifts_df,
+    _shift_id,
+    _shift_version,
+    _week_start,
+    _worked_days_same_team_role,
+)
+
+OBJECTIVES = ("least_overtime_risk", "fairness", "continuity", "none")
+# Shifts per block when building the feasibility matrix (bounds the uint64 temporaries)
+_CHUNK = 2048
+# Statically eligible employees tried per unfilled shift during repair
+_REPAIR_CANDIDATES = 8
+
+
+def _skill_masks(skill_sets: List[frozenset], vocab: Dict[str, int]) -> np.ndarray:
+    """[n, words] uint64 bitmasks; bit vocab[skill] set for each skill held/required."""
+    words = max(1, -(-len(vocab) // 64))
+    out = np.zeros((len(skill_sets), words), dtype=np.uint64)
+    for i, skills in enumerate(skill_sets):
+        for sk in skills:
+            b = vocab[sk]
+            out[i, b // 64] |= np.uint64(1) << np.uint64(b % 64)
+    return out
+
+
+class _RosterState:
+    """Dense hour matrices + interval index for one run; assign/unassign keep them in sync."""
+
+    def __init__(
+        self,
+        open_df: pd.DataFrame,
+        sh_df: pd.DataFrame,
+        emp_df: pd.DataFrame,
+        weekly_cap: int,
+        min_rest_hours: int,
+        max_daily_hours: Optional[int],
+        allow_cross_team: bool,
+        pto_index: Optional[PTOIntervalIndex],
+    ) -> None:
+        n, m = len(open_df), len(emp_df)
+        self.emp_ids = emp_df["id"].astype(str).tolist()
+        self.min_rest_hours = min_rest_hours
+        self.max_daily_hours = max_daily_hours
+
+        # Shift attributes as arrays
+        self.dates = open_df["date"].astype(str).tolist()
+        self.starts = list(open_df["start"])
+        self.ends = list(open_df["end"])
+        self.hours = open_df["hours"].to_numpy(float)
+        days = [_iso_to_date(d) for d in self.dates]
+        self.day_idx, day_keys = pd.factorize(pd.Series(self.dates))
+        self.week_idx, week_keys = pd.factorize(pd.Series([_week_start(d).isoformat() for d in days]))
+        self.month_idx, month_keys = pd.factorize(pd.Series([f"{d.year:04d}-{d.month:02d}" for d in days]))
+        self.prev_days = [(d - timedelta(days=1)).isoformat() for d in days]
+
+        # Team/role codes shared by shifts and employees
+        team_codes, _ = pd.factorize(pd.concat([open_df["team"].astype(str), emp_df["teamId"].astype(str)], ignore_index=True))
+        role_codes, _ = pd.factorize(pd.concat([open_df["role"].astype(str), emp_df["role"].astype(str)], ignore_index=True))
+        self.shift_team, self.emp_team = team_codes[:n], team_codes[n:]
+        shift_role, emp_role = role_codes[:n], role_codes[n:]
+        self.teams = open_df["team"].astype(str).tolist()
+        self.roles = open_df["role"].astype(str).tolist()
+        self.emp_team_names = emp_df["teamId"].astype(str).tolist()
+
+        # Skills as bitmasks (required skills nobody holds still get a bit → never matched)
+        emp_skills = [_as_skill_set(v) for v in (emp_df["skills"] if "skills" in emp_df.columns else [None] * m)]
+        req_col = open_df["skillsRequired"] if "skillsRequired" in open_df.columns else [None] * n
+        self.required = [sorted(_as_skill_set(v)) for v in req_col]
+        vocab: Dict[str, int] = {}
+        for skills in emp_skills + [frozenset(r) for r in self.required]:
+            for sk in skills:
+                vocab.setdefault(sk, len(vocab))
+        emp_mask = _skill_masks(emp_skills, vocab)
+        req_mask = _skill_masks([frozenset(r) for r in self.required], vocab)
+
+        # Approved PTO per open-shift day
+        away = np.zeros((len(day_keys), m), dtype=bool)
+        if pto_index is not None:
+            pos = {e: j for j, e in enumerate(self.emp_ids)}
+            for k, d in enumerate(day_keys):
+                for e in pto_index.out_on(d):
+                    if e in pos:
+                        away[k, pos[e]] = True
+
+        # Static feasibility matrix
+        self.eligible = np.zeros((n, m), dtype=bool)
+        self.home = np.zeros((n, m), dtype=bool)
+        not_emp = ~emp_mask
+        for a in range(0, n, _CHUNK):
+            b = min(a + _CHUNK, n)
+            ok = shift_role[a:b, None] == emp_role[None, :]
+            home = self.shift_team[a:b, None] == self.emp_team[None, :]
+            for w in range(req_mask.shape[1]):
+                ok &= (req_mask[a:b, w, None] & not_emp[None, :, w]) == 0
+            ok &= ~away[self.day_idx[a:b]]
+            self.home[a:b] = home
+            self.eligible[a:b] = ok if allow_cross_team else ok & home
+
+        # Existing load (fixed) seeded into the dynamic matrices
+        caps = pd.to_numeric(emp_df["maxHoursPerWeek"], errors="coerce").fillna(weekly_cap).to_numpy(float)
+        self.caps = np.minimum(np.where(caps > 0, caps, weekly_cap), float(weekly_cap))
+        self.week_h = self._seed(_assigned_hours_by(sh_df, "week"), week_keys)
+        self.month_h = self._seed(_assigned_hours_by(sh_df, "month"), month_keys)
+        assigned = sh_df[sh_df["assigned_id"].notna() & sh_df["date"].isin(list(day_keys))]
+        day_totals = assigned.groupby([assigned["assigned_id"].astype(str), assigned["date"].astype(str)])["hours"].sum()
+        self.day_h = self._seed(day_totals.to_dict(), day_keys)
+        self.index = ShiftIntervalIndex.from_shifts(sh_df)
+        self.worked = _worked_days_same_team_role(sh_df)
+
+        self.assigned = np.full(n, -1, dtype=np.int64)
+        self.by_emp: Dict[int, set] = {}
+
+    def _seed(self, totals: Dict[Any, float], keys: Iterable[str]) -> np.ndarray:
+        row = {k: i for i, k in enumerate(keys)}
+        col = {e: j for j, e in enumerate(self.emp_ids)}
+        out = np.zeros((len(row), len(col)), dtype=float)
+        for (e, k), h in totals.items():
+            if k in row and e in col:
+                out[row[k], col[e]] += h
+        return out
+
+    # ----- feasibility -----
+    def feasible(self, i: int) -> np.ndarray:
+        """Employee positions passing the static, weekly-cap and daily limits for shift i."""
+        h = self.hours[i]
+        ok = self.eligible[i] & (self.week_h[self.week_idx[i]] + h <= self.caps + 1e-9)
+        day = self.day_h[self.day_idx[i]]
+        ok &= (day <= 0) if self.max_daily_hours is None else (day + h <= self.max_daily_hours + 1e-9)
+        return np.flatnonzero(ok)
+
+    def rested(self, i: int, pos: int) -> bool:
+        return not self.index.conflicts(self.emp_ids[pos], self.starts[i], self.ends[i], self.min_rest_hours)
+
+    def fits(self, i: int, pos: int) -> bool:
+        h = self.hours[i]
+        if not self.eligible[i, pos] or self.week_h[self.week_idx[i], pos] + h > self.caps[pos] + 1e-9:
+            return False
+        day = self.day_h[self.day_idx[i], pos]
+        if (day > 0) if self.max_daily_hours is None else (day + h > self.max_daily_hours + 1e-9):
+            return False
+        return self.rested(i, pos)
+
+    def rank(self, i: int, cands: np.ndarray, objective: str) -> np.ndarray:
+        """Candidates best-first; home team ahead of borrowed staff."""
+        if not len(cands):
+            return cands
+        borrowed = ~self.home[i, cands]
+        wk = self.week_h[self.week_idx[i], cands]
+        mtd = self.month_h[self.month_idx[i], cands]
+        if objective == "least_overtime_risk":
+            keys = (mtd, wk, borrowed)
+        elif objective == "fairness":
+            keys = (wk, mtd, borrowed)
+        elif objective == "continuity":
+            key = (self.prev_days[i], self.teams[i], self.roles[i])
+            cont = np.array([(self.emp_ids[p],) + key in self.worked for p in cands])
+            keys = (mtd, wk, ~cont, borrowed)
+        else:
+            keys = (borrowed,)
+        return cands[np.lexsort(keys)]  # last key is primary; stable → roster order breaks ties
+
+    def pick(self, i: int, objective: str, exclude: int = -1) -> int:
+        for pos in self.rank(i, self.feasible(i), objective):
+            if pos != exclude and self.rested(i, pos):
+                return int(pos)
+        return -1
+
+    # ----- mutation -----
+    def assign(self, i: int, pos: int) -> None:
+        h = self.hours[i]
+        self.assigned[i] = pos
+        self.by_emp.setdefault(pos, set()).add(i)
+        self.week_h[self.week_idx[i], pos] += h
+        self.month_h[self.month_idx[i], pos] += h
+        self.day_h[self.day_idx[i], pos] += h
+        self.index.add(self.emp_ids[pos], self.starts[i], self.ends[i], self.dates[i], h)
+        self.worked.add((self.emp_ids[pos], self.dates[i], self.teams[i], self.roles[i]))
+
+    def unassign(self, i: int) -> int:
+        pos = int(self.assigned[i])
+        h = self.hours[i]
+        self.assigned[i] = -1
+        self.by_emp[pos].discard(i)
+        self.week_h[self.week_idx[i], pos] -= h
+        self.month_h[self.month_idx[i], pos] -= h
+        self.day_h[self.day_idx[i], pos] -= h
+        self.index.remove(self.emp_ids[pos], self.starts[i], self.ends[i], self.dates[i], h)
+        self.worked.discard((self.emp_ids[pos], self.dates[i], self.teams[i], self.roles[i]))
+        return pos
+
+    def blockers(self, i: int, pos: int) -> List[int]:
+        """This run's assignments of `pos` that can stand in the way of shift i."""
+        rest = pd.Timedelta(hours=max(self.min_rest_hours, 0))
+        s, e = self.starts[i] - rest, self.ends[i] + rest
+        out = []
+        for j in self.by_emp.get(pos, ()):
+            same_week = self.week_idx[j] == self.week_idx[i]
+            if same_week or (self.starts[j] < e and self.ends[j] > s):
+                out.append(j)
+        return sorted(out, key=lambda j: (self.day_idx[j] != self.day_idx[i], -self.hours[j]))
+
+
+def _repair(state: _RosterState, objective: str, deadline: float) -> int:
+    """Fill open shifts by moving one of a statically eligible employee's new shifts elsewhere."""
+    repaired = 0
+    for i in np.flatnonzero(state.assigned < 0):
+        if time.perf_counter() > deadline:
+            break
+        pos = state.pick(i, objective)  # load may have shifted since the greedy pass
+        if pos >= 0:
+            state.assign(i, pos)
+            repaired += 1
+            continue
+        for pos in state.rank(i, np.flatnonzero(state.eligible[i]), objective)[:_REPAIR_CANDIDATES]:
+            done = False
+            for j in state.blockers(i, pos):
+                state.unassign(j)
+                if state.fits(i, pos):
+                    state.assign(i, pos)
+                    other = state.pick(j, objective, exclude=pos)
+                    if other >= 0:
+                        state.assign(j, other)
+                        done = True
+                        break
+                    state.unassign(i)
+                state.assign(j, pos)
+            if done:
+                repaired += 1
+                break
+    return repaired
+
+
+def _rebalance(state: _RosterState, deadline: float, max_rounds: int = 3) -> int:
+    """
+    Move shifts from heavier to lighter weekly loads (strictly lowers the sum of
+    squared weekly hours); borrowed shifts go back to the home team when possible.
+    """
+    moved = 0
+    for _ in range(max_rounds):
+        changed = 0
+        filled = np.flatnonzero(state.assigned >= 0)
+        load = state.week_h[state.week_idx[filled], state.assigned[filled]]
+        for i in filled[np.argsort(-load, kind="stable")]:
+            if time.perf_counter() > deadline:
+                return moved + changed
+            cur = int(state.assigned[i])
+            w, h = state.week_idx[i], state.hours[i]
+            cands = state.feasible(i)
+            cands = cands[cands != cur]
+            if state.home[i, cur]:
+                cands = cands[state.home[i, cands] & (state.week_h[w, cands] + h < state.week_h[w, cur])]
+            else:
+                home = cands[state.home[i, cands]]
+                cands = home if len(home) else cands[state.week_h[w, cands] + h < state.week_h[w, cur]]
+            for pos in cands[np.argsort(state.week_h[w, cands], kind="stable")]:
+                if state.rested(i, pos):
+                    state.unassign(i)
+                    state.assign(i, int(pos))
+                    changed += 1
+                    break
+        moved += changed
+        if not changed:
+            break
+    return moved
+
+
+@traced("generate_roster")
+def generate_roster(
+    employees_df: pd.DataFrame,
+    shifts_df: pd.DataFrame,
+    start: Any,
+    end: Any,
+    teams: Optional[List[str]] = None,
+    objective: str = "least_overtime_risk",
+    weekly_cap: int = 40,
+    hours_per_shift: int = 8,
+    min_rest_hours: int = 12,
+    max_daily_hours: Optional[int] = None,
+    allow_cross_team: bool = False,
+    pto_index: Optional[PTOIntervalIndex] = None,
+    improve: bool = True,
+    time_budget_s: float = 10.0,
+) -> Dict[str, Any]:
+    """
+    Fill unassigned shifts dated start..end (inclusive), optionally only for `teams`.
+    Returns {"plan", "conflicts", "stats"}; plan rows have propose_plan's shape
+    and can be passed straight to plan_apply.apply_plan.
+    """
+    t0 = time.perf_counter()
+    if objective not in OBJECTIVES:
+        raise ValueError(f"objective must be one of {OBJECTIVES}")
+    emp_df = _normalize_employees_df(employees_df).reset_index(drop=True)
+    emp_df = emp_df[emp_df["id"].notna()].reset_index(drop=True)
+    sh_df = _normalize_shifts_df(shifts_df, hours_per_shift=hours_per_shift)
+
+    lo, hi = pd.Timestamp(str(start)[:10]), pd.Timestamp(str(end)[:10])
+    open_mask = sh_df["assigned_id"].isna() & sh_df["_day"].between(lo, hi)
+    if teams:
+        open_mask &= sh_df["team"].isin([str(t) for t in teams])
+    open_df = sh_df[open_mask].sort_values(["start", "team", "role"], kind="stable").reset_index(drop=True)
+
+    plan: List[Dict[str, Any]] = []
+    conflicts: List[Dict[str, Any]] = []
+    stats = {"open": len(open_df), "filled": 0, "unfilled": 0, "repaired": 0, "rebalanced": 0}
+    state = _RosterState(
+        open_df, sh_df, emp_df, weekly_cap, min_rest_hours, max_daily_hours, allow_cross_team, pto_index
+    )
+
+    # Greedy: fewest eligible employees first, then chronological
+    order = np.lexsort((np.arange(len(open_df)), state.eligible.sum(axis=1)))
+    for i in order:
+        pos = state.pick(i, objective)
+        if pos >= 0:
+            state.assign(i, pos)
+
+    if improve:
+        deadline = t0 + time_budget_s
+        stats["repaired"] = _repair(state, objective, deadline)
+        if objective in ("least_overtime_risk", "fairness"):
+            stats["rebalanced"] = _rebalance(state, deadline)
+
+    for i, row in open_df.iterrows():
+        d_iso, team, role = state.dates[i], state.teams[i], state.roles[i]
+        pos = int(state.assigned[i])
+        if pos < 0:
+            conflict = {"date": d_iso, "team": team, "role": role, "shift_id": _shift_id(row), "reason": "no viable candidate"}
+            if state.required[i]:
+                conflict["skills_required"] = state.required[i]
+            conflicts.append(conflict)
+            continue
+        notes = f"Rostered {role} shift."
+        if not state.home[i, pos]:
+            notes += f" Borrowed from {state.emp_team_names[pos]}."
+        plan.append(
+            {
+                "date": d_iso,
+                "team": team,
+                "role": role,
+                "start": row["start"].isoformat() if pd.notna(row["start"]) else None,
+                "end": row["end"].isoformat() if pd.notna(row["end"]) else None,
+                "shift_id": _shift_id(row),
+                "version": _shift_version(row),
+                "assigned_employee_id": state.emp_ids[pos],
+                "notes": notes,
+            }
+        )
+
+    stats["filled"], stats["unfilled"] = len(plan), len(conflicts)
+    stats["seconds"] = round(time.perf_counter() - t0, 3)
+    ROSTER_LATENCY.observe(time.perf_counter() - t0, objective=objective)
+    ROSTER_SHIFTS.inc(len(plan), outcome="filled")
+    ROSTER_SHIFTS.inc(len(conflicts), outcome="unfilled")
+    return {"plan": plan, "conflicts": conflicts, "stats": stats}
+
+
+def load_roster_frames(database, start: date, end: date) -> Dict[str, pd.DataFrame]:
+    """
+    All employees, plus shifts from the month/week start before `start` to a week past `end`.
+    Loads every team (borrowing and double-booking checks need them); generate_roster(teams=...)
+    decides which shifts get filled.
+    """
+    from app.arrow_loader import load_employees, load_shifts
+
+    lo = (min(_week_start(start), start.replace(day=1)) - timedelta(days=1)).isoformat()
+    hi = (_week_start(end) + timedelta(days=7)).isoformat()
+    emp_df = load_employees(database["employees"])
+    sh_df = load_shifts(database["shifts"], {"date": {"$gte": lo, "$lte": hi}})
+    return {"employees": emp_df, "shifts": sh_df}
+
+
+def main():
+    from app.db import get_db
+    from app.plan_apply import apply_plan
+    from app.pto_worker import load_pto_index
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--start", default=_week_start(date.today()).isoformat())
+    ap.add_argument("--weeks", type=int, default=4)
+    ap.add_argument("--teams", default="", help="comma-separated; default all teams")
+    ap.add_argument("--objective", choices=OBJECTIVES, default="least_overtime_risk")
+    ap.add_argument("--weekly-cap", type=int, default=40)
+    ap.add_argument("--min-rest-hours", type=int, default=12)
+    ap.add_argument("--cross-team", action="store_true")
+    ap.add_argument("--apply", action="store_true", help="write assignments back (default: dry run)")
+    ap.add_argument("--tenant", default=None)
+    args = ap.parse_args()
+
+    database = get_db(args.tenant)
+    start = date.fromisoformat(args.start)
+    end = start + timedelta(days=7 * args.weeks - 1)
+    teams = [t.strip() for t in args.teams.split(",") if t.strip()] or None
+    frames = load_roster_frames(database, start, end)
+    emp_df = frames["employees"]
+    team_of = dict(zip(emp_df["id"].astype(str), emp_df["teamId"].astype(str)))
+    pto_index = load_pto_index(database["pto_requests"], start.isoformat(), end.isoformat(), team_of=team_of)
+
+    result = generate_roster(
+        emp_df, frames["shifts"], start, end, teams=teams, objective=args.objective,
+        weekly_cap=args.weekly_cap, min_rest_hours=args.min_rest_hours,
+        allow_cross_team=args.cross_team, pto_index=pto_index,
+    )
+    print(result["stats"])
+    if args.apply and result["plan"]:
+        names = dict(zip(emp_df["id"].astype(str), emp_df["name"].astype(str)))
+        outcome = apply_plan(
+            database["shifts"], result["plan"], employee_names=names,
+            weekly_cap=args.weekly_cap, min_rest_hours=args.min_rest_hours,
+            employees_col=database["employees"],
+        )
+        print(f"applied={len(outcome['applied'])} lost={len(outcome['lost'])} transaction={outcome['transaction']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,21 @@
 # app/scheduler.py
 from __future__ import annotations
 
+import time
+from bisect import bisect_left, bisect_right
 from datetime import date, timedelta
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
+from app.metrics import PLAN_CANDIDATES, PLAN_LATENCY, PLAN_SHIFTS, traced
+
+# Shifts stored without explicit timestamps start at this hour on their date.
+DEFAULT_SHIFT_START_HOUR = 9
+
+_NS_PER_HOUR = 3_600_000_000_000
+
 
 # ---------- utils ----------
 def _iso_to_date(s: str) -> date:
@@ -16,17 +26,35 @@ def _week_start(d: date) -> date:
     return d - timedelta(days=d.weekday())
 
 
-def _normalize_shifts_df(shifts_df: pd.DataFrame) -> pd.DataFrame:
-    """Ensure consistent snake_case column names and defaults."""
-    df = shifts_df.copy()
+def _to_naive_datetime(values: pd.Series) -> pd.Series:
+    """Parse ISO strings/datetimes into naive datetime64 (NaT on failure)."""
+    if pd.api.types.is_datetime64_dtype(values.dtype):
+        return values  # already naive datetime64 (e.g. from app.arrow_loader)
+    parsed = pd.to_datetime(values, errors="coerce", utc=True, format="ISO8601")
+    return parsed.dt.tz_localize(None)
+
+
+def _is_text(values: pd.Series) -> bool:
+    """Already a nullable string column (pandas "string" or Arrow-backed)."""
+    return values.dtype != object and pd.api.types.is_string_dtype(values.dtype)
+
+
+_SHIFT_RENAMES = {"assignedEmployeeId": "assigned_id", "assignedEmployeeName": "assigned_name", "teamId": "team"}
+
+
+def _normalize_shifts_df(shifts_df: pd.DataFrame, hours_per_shift: int = 8) -> pd.DataFrame:
+    """
+    Ensure consistent snake_case column names and defaults.
+    Every shift gets `start`/`end` timestamps: stored values win, otherwise the
+    shift starts at DEFAULT_SHIFT_START_HOUR on its date.
+    Every shift gets float `hours`: stored value, else end - start when both
+    timestamps are stored, else hours_per_shift.
+    """
+    # Shallow: columns are replaced below, never written in place, so no data copy is needed
+    df = shifts_df.copy(deep=False)
 
     # Rename camelCase → snake_case
-    if "assignedEmployeeId" in df.columns:
-        df = df.rename(columns={"assignedEmployeeId": "assigned_id"})
-    if "assignedEmployeeName" in df.columns:
-        df = df.rename(columns={"assignedEmployeeName": "assigned_name"})
-    if "teamId" in df.columns:
-        df = df.rename(columns={"teamId": "team"})
+    df.columns = [_SHIFT_RENAMES.get(c, c) for c in df.columns]
 
     # Guarantee essential columns
     for col, default in [
@@ -39,107 +67,431 @@ def _normalize_shifts_df(shifts_df: pd.DataFrame) -> pd.DataFrame:
         if col not in df.columns:
             df[col] = default
 
-    # Normalize types
-    df["date"] = df["date"].astype(str)
+    # Normalize types (string-typed columns, e.g. Arrow-backed, are left as they are)
+    if not _is_text(df["date"]):
+        df["date"] = df["date"].astype(str)
     for c in ["team", "role", "assigned_id", "assigned_name"]:
-        if c in df.columns:
+        if c in df.columns and not _is_text(df[c]):
             df[c] = df[c].astype("string").where(df[c].notna(), None)
 
+    # Time-of-day intervals + per-shift length
+    day = pd.to_datetime(df["date"], errors="coerce", format="ISO8601")
+    start = _to_naive_datetime(df["start"]) if "start" in df.columns else pd.Series(pd.NaT, index=df.index)
+    end = _to_naive_datetime(df["end"]) if "end" in df.columns else pd.Series(pd.NaT, index=df.index)
+    hours = pd.to_numeric(df["hours"], errors="coerce") if "hours" in df.columns else pd.Series(float("nan"), index=df.index)
+    hours = hours.fillna((end - start) / pd.Timedelta(hours=1)).fillna(hours_per_shift).astype(float)
+    start = start.fillna(day + pd.Timedelta(hours=DEFAULT_SHIFT_START_HOUR))
+    end = end.fillna(start + pd.to_timedelta(hours, unit="h"))
+    df["start"] = start.astype("datetime64[ns]", copy=False)
+    df["end"] = end.astype("datetime64[ns]", copy=False)
+    df["hours"] = hours
+    df["_day"] = day
+
     return df
 
 
-# ---------- weekly + monthly hours ----------
-def compute_weekly_hours(shifts_df: pd.DataFrame, hours_per_shift: int = 8) -> Dict[Tuple[str, str], int]:
+def _normalize_employees_df(employees_df: pd.DataFrame) -> pd.DataFrame:
+    """String-typed id/teamId/role/name and a maxHoursPerWeek column."""
+    emp_df = employees_df.copy(deep=False)
+    for c in ["id", "teamId", "role", "name"]:
+        if c in emp_df.columns and not _is_text(emp_df[c]):
+            emp_df[c] = emp_df[c].astype("string").where(emp_df[c].notna(), None)
+    if "maxHoursPerWeek" not in emp_df.columns:
+        emp_df["maxHoursPerWeek"] = 40
+    return emp_df
+
+
+# ---------- interval index ----------
+class ShiftIntervalIndex:
     """
-    Returns {(employee_id, week_start_iso): hours}.
-    Only counts shifts with a valid assigned_id.
+    Per-employee shift intervals (ns since epoch) sorted by start, plus a
+    running maximum of `ends` in that order. Stored data can be double-booked
+    (overlapping or nested shifts), so the probe compares against the longest
+    reach of every earlier shift, not just the last one: a single bisect, O(log n).
     """
-    df = _normalize_shifts_df(shifts_df)
-    out: Dict[Tuple[str, str], int] = {}
 
-    for _, row in df.iterrows():
-        emp = row.get("assigned_id")
-        d_str = row.get("date")
+    def __init__(self) -> None:
+        self._starts: Dict[str, List[int]] = {}
+        self._ends: Dict[str, List[int]] = {}
+        self._max_ends: Dict[str, List[int]] = {}
+        self._day_hours: Dict[Tuple[str, str], float] = {}
+
+    @classmethod
+    def from_shifts(cls, sh_df: pd.DataFrame) -> "ShiftIntervalIndex":
+        """Build from a normalized shifts frame (assigned rows with valid timestamps only)."""
+        idx = cls()
+        df = sh_df[sh_df["assigned_id"].notna() & sh_df["start"].notna() & sh_df["end"].notna()]
+        if df.empty:
+            return idx
+        df = df.sort_values(["assigned_id", "start"], kind="stable")
+        emp = df["assigned_id"].astype(str).to_numpy()
+        starts = df["start"].to_numpy("datetime64[ns]").astype("int64")
+        ends = df["end"].to_numpy("datetime64[ns]").astype("int64")
+
+        # Group boundaries on the sorted employee column
+        cuts = np.concatenate(([0], np.flatnonzero(emp[1:] != emp[:-1]) + 1, [len(emp)]))
+        for a, b in zip(cuts[:-1], cuts[1:]):
+            idx._starts[emp[a]] = starts[a:b].tolist()
+            idx._ends[emp[a]] = ends[a:b].tolist()
+            idx._max_ends[emp[a]] = np.maximum.accumulate(ends[a:b]).tolist()
+
+        day_hours = pd.Series(df["hours"].to_numpy(float)).groupby([emp, df["date"].astype(str).to_numpy()]).sum()
+        idx._day_hours = {(str(e), str(d)): float(h) for (e, d), h in day_hours.items()}
+        return idx
+
+    def add(self, emp_id: str, start: pd.Timestamp, end: pd.Timestamp, d_iso: str, hours: float) -> None:
+        """Record a newly planned assignment so later checks see it."""
+        s, e = int(start.value), int(end.value)
+        starts = self._starts.setdefault(emp_id, [])
+        ends = self._ends.setdefault(emp_id, [])
+        pos = bisect_left(starts, s)
+        starts.insert(pos, s)
+        ends.insert(pos, e)
+        self._max_ends.setdefault(emp_id, []).insert(pos, e)
+        self._refresh_max_ends(emp_id, pos)
+        key = (emp_id, str(d_iso))
+        self._day_hours[key] = self._day_hours.get(key, 0.0) + hours
+
+    def remove(self, emp_id: str, start: pd.Timestamp, end: pd.Timestamp, d_iso: str, hours: float) -> None:
+        """Undo add() (used when a planned assignment is moved)."""
+        s, e = int(start.value), int(end.value)
+        starts = self._starts.get(emp_id, [])
+        ends = self._ends.get(emp_id, [])
+        pos = bisect_left(starts, s)
+        while pos < len(starts) and starts[pos] == s and ends[pos] != e:
+            pos += 1
+        if pos < len(starts) and starts[pos] == s:
+            del starts[pos]
+            del ends[pos]
+            del self._max_ends[emp_id][pos]
+            self._refresh_max_ends(emp_id, pos)
+        key = (emp_id, str(d_iso))
+        self._day_hours[key] = self._day_hours.get(key, 0.0) - hours
+
+    def conflicts(self, emp_id: str, start: pd.Timestamp, end: pd.Timestamp, min_rest_hours: float = 0) -> bool:
+        """True if [start, end) overlaps, or sits within min_rest_hours of, an existing shift."""
+        starts = self._starts.get(emp_id)
+        if not starts:
+            return False
+        rest = int(max(min_rest_hours, 0) * _NS_PER_HOUR)
+        s, e = int(start.value), int(end.value)
+        # Shifts starting before the padded window ends clash iff any of them reaches past its start
+        pos = bisect_left(starts, e + rest)
+        return pos > 0 and self._max_ends[emp_id][pos - 1] > s - rest
+
+    def _refresh_max_ends(self, emp_id: str, pos: int) -> None:
+        ends, max_ends = self._ends[emp_id], self._max_ends[emp_id]
+        run = max_ends[pos - 1] if pos > 0 else None
+        for i in range(pos, len(ends)):
+            run = ends[i] if run is None or ends[i] > run else run
+            max_ends[i] = run
+
+    def day_hours(self, emp_id: str, d_iso: str) -> float:
+        return self._day_hours.get((emp_id, str(d_iso)), 0.0)
+
+
+# ---------- PTO interval index ----------
+def _ordinal(value: Any) -> int:
+    return _iso_to_date(str(value)[:10]).toordinal()
+
+
+# Node: (center, starts asc, rows by start, -ends asc, rows by end desc, left, right). It holds the
+# requests containing center; left/right hold those entirely before/after it.
+_CenteredNode = Tuple[int, List[int], List[Dict[str, Any]], List[int], List[Dict[str, Any]], Any, Any]
+
+
+def _build_centered(items: List[int], starts: List[int], ends: List[int], rows: List[Dict[str, Any]]) -> Optional[_CenteredNode]:
+    """items: positions sorted by start. Center = the median item's start, so every node is non-empty."""
+    if not items:
+        return None
+    center = starts[items[len(items) // 2]]
+    here = [i for i in items if starts[i] <= center <= ends[i]]
+    by_end = sorted(here, key=ends.__getitem__, reverse=True)
+    return (
+        center,
+        [starts[i] for i in here],
+        [rows[i] for i in here],
+        [-ends[i] for i in by_end],
+        [rows[i] for i in by_end],
+        _build_centered([i for i in items if ends[i] < center], starts, ends, rows),
+        _build_centered([i for i in items if starts[i] > center], starts, ends, rows),
+    )
 
-        if emp is None or pd.isna(emp) or str(emp).strip() == "":
-            continue
-        if d_str is None or pd.isna(d_str) or str(d_str).strip() == "":
-            continue
 
+class PTOIntervalIndex:
+    """
+    Per-team PTO requests as inclusive day intervals, in a centered interval
+    tree per team. Each node keeps the requests containing its center, sorted
+    by start and by end; a window either covers the center (report the node,
+    descend both ways) or lies to one side (report a bisected prefix of one
+    list, descend that way). Nodes are never empty, so nodes visited
+    without a hit lie on the window's two boundary paths: O(log n + k) however
+    long individual requests are. add() marks the team's tree for a rebuild
+    on the next query.
+    """
+
+    def __init__(self) -> None:
+        self._starts: Dict[str, List[int]] = {}
+        self._ends: Dict[str, List[int]] = {}
+        self._rows: Dict[str, List[Dict[str, Any]]] = {}
+        self._trees: Dict[str, Optional[_CenteredNode]] = {}
+
+    @classmethod
+    def from_requests(
+        cls, requests: Iterable[Dict[str, Any]], team_of: Optional[Dict[str, str]] = None
+    ) -> "PTOIntervalIndex":
+        """
+        Build from pto_requests documents. Requests stored without a teamId are
+        placed via team_of (employee id → team); unplaceable or undated ones are skipped.
+        """
+        idx = cls()
+        for req in requests:
+            idx.add(req, team_of=team_of, _sorted=False)
+        for team, starts in idx._starts.items():
+            order = sorted(range(len(starts)), key=starts.__getitem__)
+            idx._starts[team] = [starts[i] for i in order]
+            idx._ends[team] = [idx._ends[team][i] for i in order]
+            idx._rows[team] = [idx._rows[team][i] for i in order]
+            idx._tree(team)
+        return idx
+
+    def add(self, req: Dict[str, Any], team_of: Optional[Dict[str, str]] = None, _sorted: bool = True) -> bool:
+        emp_id = str(req.get("employeeId"))
+        team = req.get("teamId") or (team_of or {}).get(emp_id)
         try:
-            d = _iso_to_date(d_str)
-        except Exception:
-            continue
+            s, e = _ordinal(req["start"]), _ordinal(req["end"])
+        except (KeyError, TypeError, ValueError):
+            return False
+        if team is None or e < s:
+            return False
+        team = str(team)
+        row = {
+            "id": req.get("id"),
+            "employeeId": emp_id,
+            "teamId": team,
+            "start": date.fromordinal(s).isoformat(),
+            "end": date.fromordinal(e).isoformat(),
+            "status": req.get("status", "pending"),
+        }
+        starts = self._starts.setdefault(team, [])
+        pos = bisect_left(starts, s) if _sorted else len(starts)
+        starts.insert(pos, s)
+        self._ends.setdefault(team, []).insert(pos, e)
+        self._rows.setdefault(team, []).insert(pos, row)
+        self._trees.pop(team, None)
+        return True
+
+    def _tree(self, team: str) -> Optional[_CenteredNode]:
+        if team not in self._trees:
+            starts = self._starts[team]
+            self._trees[team] = _build_centered(list(range(len(starts))), starts, self._ends[team], self._rows[team])
+        return self._trees[team]
+
+    def overlapping(
+        self, lo: Any, hi: Any, team: Optional[str] = None, statuses: Optional[Iterable[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Requests intersecting the inclusive window [lo, hi] (ISO dates), optionally for one team/status set; unordered."""
+        a, b = _ordinal(lo), _ordinal(hi)
+        wanted = set(statuses) if statuses is not None else None
+        hits: List[Dict[str, Any]] = []
+        for t in [str(team)] if team is not None else list(self._starts):
+            if not self._starts.get(t):
+                continue
+            stack = [self._tree(t)]
+            while stack:
+                node = stack.pop()
+                if node is None:
+                    continue
+                center, starts, by_start, neg_ends, by_end, left, right = node
+                if b < center:
+                    hits.extend(by_start[: bisect_right(starts, b)])
+                    stack.append(left)
+                elif a > center:
+                    hits.extend(by_end[: bisect_right(neg_ends, -a)])
+                    stack.append(right)
+                else:
+                    hits.extend(by_start)
+                    stack.append(left)
+                    stack.append(right)
+        if wanted is None:
+            return hits
+        return [r for r in hits if r["status"] in wanted]
+
+    def out_on(self, day: Any, team: Optional[str] = None, statuses: Iterable[str] = ("approved",)) -> set:
+        """Employee ids away on `day`."""
+        return {r["employeeId"] for r in self.overlapping(day, day, team=team, statuses=statuses)}
+
+    def digest(self, lo: Any, hi: Any, statuses: Iterable[str] = ("approved",)) -> str:
+        """Stable text of the requests a plan for [lo, hi] depends on (for cache keys)."""
+        rows = self.overlapping(lo, hi, statuses=statuses)
+        return ";".join(sorted(f"{r['employeeId']}:{r['start']}:{r['end']}" for r in rows))
+
+
+# ---------- skill index ----------
+def _as_skill_set(value: Any) -> frozenset:
+    """Skills from a Mongo field: list/tuple/array of names, a single name, or missing."""
+    if isinstance(value, str):
+        value = [value]
+    elif not isinstance(value, (list, tuple, set, frozenset, np.ndarray)):
+        return frozenset()  # None / NaN / pd.NA
+    return frozenset(str(v).strip().lower() for v in value if v is not None and str(v).strip())
+
+
+class SkillIndex:
+    """
+    Inverted index over the roster: team / role / skill → bitset (Python int)
+    of employee positions. Required skills are matched by AND-ing bitsets and
+    only the set bits are walked, so filtering cost follows the matches.
+    """
+
+    def __init__(self) -> None:
+        self.ids: List[str] = []
+        self.caps: List[Optional[int]] = []
+        self.teams: List[str] = []
+        self._pos: Dict[str, int] = {}
+        self._team: Dict[str, int] = {}
+        self._role: Dict[str, int] = {}
+        self._skill: Dict[str, int] = {}
+
+    @classmethod
+    def from_employees(cls, emp_df: pd.DataFrame) -> "SkillIndex":
+        idx = cls()
+        skills = emp_df["skills"] if "skills" in emp_df.columns else pd.Series(None, index=emp_df.index)
+        caps = emp_df["maxHoursPerWeek"] if "maxHoursPerWeek" in emp_df.columns else pd.Series(None, index=emp_df.index)
+        for i, (emp_id, team, role, skill_val, cap) in enumerate(
+            zip(emp_df["id"], emp_df["teamId"], emp_df["role"], skills, caps)
+        ):
+            bit = 1 << i
+            idx.ids.append(str(emp_id))
+            idx.caps.append(int(cap) if pd.notna(cap) and cap else None)
+            idx.teams.append(str(team))
+            idx._pos[str(emp_id)] = i
+            idx._team[str(team)] = idx._team.get(str(team), 0) | bit
+            idx._role[str(role)] = idx._role.get(str(role), 0) | bit
+            for sk in _as_skill_set(skill_val):
+                idx._skill[sk] = idx._skill.get(sk, 0) | bit
+        return idx
+
+    def bits_for(self, emp_ids: Iterable[str]) -> int:
+        bits = 0
+        for e in emp_ids:
+            if str(e) in self._pos:
+                bits |= 1 << self._pos[str(e)]
+        return bits
+
+    def match(self, role: str, skills: Iterable[str] = (), team: Optional[str] = None, exclude: int = 0) -> int:
+        """Bitset of employees with `role`, every skill in `skills` and (optionally) on `team`."""
+        bits = self._role.get(str(role), 0)
+        if team is not None:
+            bits &= self._team.get(str(team), 0)
+        for sk in skills:
+            if not bits:
+                break
+            bits &= self._skill.get(sk, 0)
+        return bits & ~exclude
+
+    @staticmethod
+    def members(bits: int) -> Iterator[int]:
+        """Positions of the set bits, lowest first."""
+        while bits:
+            low = bits & -bits
+            yield low.bit_length() - 1
+            bits ^= low
 
-        wk = _week_start(d).isoformat()
-        out[(emp, wk)] = out.get((emp, wk), 0) + int(hours_per_shift)
-    return out
 
+# ---------- weekly + monthly hours ----------
+def _assigned_hours_by(df: pd.DataFrame, period: str) -> Dict[Tuple[str, str], float]:
+    """
+    Vectorized hour totals on a normalized frame, keyed by (employee_id, bucket).
+    period: "week" → ISO Monday of the shift date, "month" → YYYY-MM.
+    """
+    ok = df["assigned_id"].notna() & df["_day"].notna()
+    ok &= df["assigned_id"].str.strip().ne("").fillna(True).astype(bool)
+    sub = df.loc[ok, ["assigned_id", "_day", "hours"]]
+    if sub.empty:
+        return {}
+
+    # Group on datetime64 buckets; only the (few) unique keys get formatted
+    day = sub["_day"].to_numpy("datetime64[D]")
+    if period == "week":
+        bucket = day - sub["_day"].dt.weekday.to_numpy().astype("timedelta64[D]")
+        fmt = "%Y-%m-%d"
+    else:
+        bucket = day.astype("datetime64[M]")
+        fmt = "%Y-%m"
+    totals = sub["hours"].groupby([sub["assigned_id"].astype(str).to_numpy(), bucket]).sum()
+    labels = {k: pd.Timestamp(k).strftime(fmt) for k in totals.index.levels[1]}
+    return {(str(e), labels[k]): float(h) for (e, k), h in totals.items()}
+
+
+def compute_weekly_hours(shifts_df: pd.DataFrame, hours_per_shift: int = 8) -> Dict[Tuple[str, str], float]:
+    """
+    Returns {(employee_id, week_start_iso): hours}.
+    Only counts shifts with a valid assigned_id. Uses each shift's own hours;
+    hours_per_shift is the fallback for shifts with neither hours nor end time.
+    """
+    return _assigned_hours_by(_normalize_shifts_df(shifts_df, hours_per_shift=hours_per_shift), "week")
 
-def _month_to_date_hours(shifts_df: pd.DataFrame, hours_per_shift: int = 8) -> Dict[Tuple[str, str], int]:
+
+def _month_to_date_hours(shifts_df: pd.DataFrame, hours_per_shift: int = 8) -> Dict[Tuple[str, str], float]:
     """Returns {(employee_id, YYYY-MM): hours}"""
-    df = _normalize_shifts_df(shifts_df)
-    out: Dict[Tuple[str, str], int] = {}
-    for _, row in df.iterrows():
-        emp = row.get("assigned_id")
-        d_str = row.get("date")
+    return _assigned_hours_by(_normalize_shifts_df(shifts_df, hours_per_shift=hours_per_shift), "month")
 
-        if emp is None or pd.isna(emp) or str(emp).strip() == "":
-            continue
-        if d_str is None or pd.isna(d_str) or str(d_str).strip() == "":
-            continue
 
-        try:
-            d = _iso_to_date(d_str)
-        except Exception:
-            continue
+# ---------- helpers ----------
+def _worked_days_same_team_role(df: pd.DataFrame) -> set:
+    """{(employee_id, date_iso, team, role)} for every assigned shift."""
+    assigned = df[df["assigned_id"].notna()]
+    return set(
+        zip(
+            assigned["assigned_id"].astype(str),
+            assigned["date"].astype(str),
+            assigned["team"].astype(str),
+            assigned["role"].astype(str),
+        )
+    )
 
-        key = (emp, f"{d.year:04d}-{d.month:02d}")
-        out[key] = out.get(key, 0) + int(hours_per_shift)
-    return out
 
+def _shift_id(row: pd.Series) -> Optional[str]:
+    sid = row.get("id")
+    return None if sid is None or pd.isna(sid) else str(sid)
 
-# ---------- helpers ----------
-def _already_assigned_on_date(df: pd.DataFrame, emp_id: str, d_iso: str) -> bool:
-    subset = df[(df["date"].astype(str) == str(d_iso)) & (df["assigned_id"] == emp_id)]
-    return not subset.empty
 
+def _shift_version(row: pd.Series) -> int:
+    """Optimistic-lock version of the shift as read (missing → 0)."""
+    v = row.get("version")
+    return 0 if v is None or pd.isna(v) else int(v)
 
-def _worked_previous_day_same_team_role(df: pd.DataFrame, emp_id: str, team: str, role: str, d_iso: str) -> bool:
-    try:
-        d = _iso_to_date(d_iso)
-    except Exception:
-        return False
-    prev = (d - timedelta(days=1)).isoformat()
-    subset = df[
-        (df["date"].astype(str) == prev)
-        & (df["team"] == team)
-        & (df["role"] == role)
-        & (df["assigned_id"] == emp_id)
-    ]
-    return not subset.empty
-
-
-def _violates_rest(df: pd.DataFrame, emp_id: str, d_iso: str, min_rest_hours: int) -> bool:
-    """Simple rest rule: if min_rest_hours >= 24, block working consecutive days."""
-    if min_rest_hours <= 0:
-        return False
-    if min_rest_hours < 24:
-        return False
 
-    try:
-        d = _iso_to_date(d_iso)
-    except Exception:
+def _violates_rest(
+    index: ShiftIntervalIndex,
+    emp_id: str,
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+    min_rest_hours: int,
+) -> bool:
+    """Rest rule: the shift may not overlap, or start/end within min_rest_hours of, another shift."""
+    if pd.isna(start) or pd.isna(end):
         return False
+    return index.conflicts(emp_id, start, end, min_rest_hours)
 
-    prev = (d - timedelta(days=1)).isoformat()
-    nextd = (d + timedelta(days=1)).isoformat()
-    prev_assigned = _already_assigned_on_date(df, emp_id, prev)
-    next_assigned = _already_assigned_on_date(df, emp_id, nextd)
-    return prev_assigned or next_assigned
+
+def _exceeds_daily_max(
+    index: ShiftIntervalIndex,
+    emp_id: str,
+    d_iso: str,
+    shift_hours: float,
+    max_daily_hours: Optional[int],
+) -> bool:
+    """Without max_daily_hours an employee works at most one shift per date."""
+    used = index.day_hours(emp_id, d_iso)
+    if max_daily_hours is None:
+        return used > 0
+    return used + shift_hours > max_daily_hours
 
 
 # ---------- main planner ----------
+@traced("propose_plan")
 def propose_plan(
     employees_df: pd.DataFrame,
     shifts_df: pd.DataFrame,
@@ -151,83 +503,117 @@ def propose_plan(
     weekly_cap: int = 40,
     hours_per_shift: int = 8,
     min_rest_hours: int = 12,
+    max_daily_hours: Optional[int] = None,
+    allow_cross_team: bool = False,
+    pto_index: Optional[PTOIntervalIndex] = None,
 ) -> Dict[str, Any]:
     """
     Deterministic assignment engine:
-      • Cover PTO shifts for same team/role
-      • Skip double-booking
-      • Respect weekly caps + min rest
+      • Cover PTO shifts for same team/role, with every skill in the shift's skillsRequired
+      • allow_cross_team: borrow a same-role, skilled employee from another team
+        when nobody on the home team is viable
+      • Skip double-booking (overlapping shifts, or more than max_daily_hours on a date)
+      • pto_index: skip candidates on approved PTO that day
+      • Respect weekly caps + min rest between shift end and next start
       • Objectives: least_overtime_risk | fairness | continuity | none
     """
-    emp_df = employees_df.copy()
-    sh_df = _normalize_shifts_df(shifts_df)
+    t0 = time.perf_counter()
+    evaluated = found = 0
+    emp_df = _normalize_employees_df(employees_df)
+    sh_df = _normalize_shifts_df(shifts_df, hours_per_shift=hours_per_shift)
 
-    # Normalize employees
-    for c in ["id", "teamId", "role", "name"]:
-        if c in emp_df.columns:
-            emp_df[c] = emp_df[c].astype("string").where(emp_df[c].notna(), None)
-    if "maxHoursPerWeek" not in emp_df.columns:
-        emp_df["maxHoursPerWeek"] = 40
+    plan: List[Dict[str, Any]] = []
+    conflicts: List[Dict[str, Any]] = []
 
-    # Find shifts to cover
+    # Unparseable PTO dates cover nothing; report them instead of failing the whole plan
+    days = set()
+    for raw in sorted({str(d) for d in pto_dates}):
+        try:
+            days.add(_iso_to_date(raw).isoformat())
+        except ValueError:
+            conflicts.append({"date": raw, "team": str(team_needed), "role": str(role_needed), "reason": "invalid date"})
+
+    # Find shifts to cover: a date-range test, plus membership only if the dates have gaps
+    dates = sorted(days)
+    in_window = sh_df["_day"].between(pd.Timestamp(dates[0]), pd.Timestamp(dates[-1])) if dates else False
+    if dates and len(dates) != _ordinal(dates[-1]) - _ordinal(dates[0]) + 1:
+        in_window &= sh_df["date"].isin(dates)
     target_mask = (
-        sh_df["date"].isin([str(d) for d in pto_dates])
+        in_window
         & (sh_df["team"] == str(team_needed))
         & (sh_df["role"] == str(role_needed))
         & ((sh_df["assigned_id"].isna()) | (sh_df["assigned_id"] == str(pto_emp_id)))
     )
-    target = sh_df[target_mask].copy().sort_values("date")
+    target = sh_df[target_mask].copy().sort_values(["date", "start"])
 
     # Pre-compute usage
-    wk_hours = compute_weekly_hours(sh_df, hours_per_shift=hours_per_shift)
-    mt_hours = _month_to_date_hours(sh_df, hours_per_shift=hours_per_shift)
-
-    # Candidate pool: same team + role, not PTO emp
-    pool = emp_df[
-        (emp_df["teamId"] == str(team_needed))
-        & (emp_df["role"] == str(role_needed))
-        & (emp_df["id"] != str(pto_emp_id))
-    ].copy()
+    wk_hours = _assigned_hours_by(sh_df, "week")
+    mt_hours = _assigned_hours_by(sh_df, "month")
+    index = ShiftIntervalIndex.from_shifts(sh_df)
+    worked = _worked_days_same_team_role(sh_df)
 
-    plan: List[Dict[str, Any]] = []
-    conflicts: List[Dict[str, Any]] = []
+    # Candidate pool: bitsets over the roster (PTO emp excluded)
+    skill_index = SkillIndex.from_employees(emp_df)
+    pto_bits = skill_index.bits_for([pto_emp_id])
+    away_bits: Dict[str, int] = {}
 
     for _, row in target.iterrows():
         d_iso = str(row["date"])
         team = str(row["team"])
         role = str(row["role"])
+        start, end = row["start"], row["end"]
+        shift_hours = float(row["hours"])
+        required = sorted(_as_skill_set(row.get("skillsRequired")))
 
-        viable = []
-        for _, cand in pool.iterrows():
-            cand_id = str(cand["id"])
-
-            if _already_assigned_on_date(sh_df, cand_id, d_iso):
-                continue
-            if _violates_rest(sh_df, cand_id, d_iso, min_rest_hours):
-                continue
-
-            per_cap = int(cand.get("maxHoursPerWeek") or weekly_cap)
-            cap_to_use = min(int(weekly_cap), per_cap)
-
-            try:
-                d = _iso_to_date(d_iso)
-            except Exception:
-                continue
-
-            wk = _week_start(d).isoformat()
-            used = wk_hours.get((cand_id, wk), 0)
-            if used + hours_per_shift > cap_to_use:
-                continue
-
-            month_key = (cand_id, f"{d.year:04d}-{d.month:02d}")
-            mtd = mt_hours.get(month_key, 0)
-            cont = _worked_previous_day_same_team_role(sh_df, cand_id, team, role, d_iso)
-            viable.append(
-                {"cand_id": cand_id, "wk_used": used, "mtd_used": mtd, "continuity": cont}
-            )
+        try:
+            d = _iso_to_date(d_iso)
+        except Exception:
+            conflicts.append({"date": d_iso, "team": team, "role": role, "reason": "invalid date"})
+            continue
+        wk = _week_start(d).isoformat()
+        prev_iso = (d - timedelta(days=1)).isoformat()
+        if d_iso not in away_bits:
+            away_bits[d_iso] = pto_bits | (skill_index.bits_for(pto_index.out_on(d_iso)) if pto_index else 0)
+        away = away_bits[d_iso]
+
+        def _viable(bits: int) -> List[Dict[str, Any]]:
+            out = []
+            nonlocal evaluated
+            for pos in SkillIndex.members(bits):
+                evaluated += 1
+                cand_id = skill_index.ids[pos]
+
+                if _exceeds_daily_max(index, cand_id, d_iso, shift_hours, max_daily_hours):
+                    continue
+                if _violates_rest(index, cand_id, start, end, min_rest_hours):
+                    continue
+
+                per_cap = skill_index.caps[pos] or int(weekly_cap)
+                cap_to_use = min(int(weekly_cap), per_cap)
+                used = wk_hours.get((cand_id, wk), 0)
+                if used + shift_hours > cap_to_use:
+                    continue
+
+                mtd = mt_hours.get((cand_id, f"{d.year:04d}-{d.month:02d}"), 0)
+                cont = (cand_id, prev_iso, team, role) in worked
+                out.append(
+                    {"cand_id": cand_id, "team": skill_index.teams[pos], "wk_used": used, "mtd_used": mtd, "continuity": cont}
+                )
+            return out
+
+        home_bits = skill_index.match(role, required, team=team, exclude=away)
+        viable = _viable(home_bits)
+        borrowed = False
+        if not viable and allow_cross_team:
+            viable = _viable(skill_index.match(role, required, exclude=away | home_bits))
+            borrowed = bool(viable)
+        found += len(viable)
 
         if not viable:
-            conflicts.append({"date": d_iso, "team": team, "role": role, "reason": "no viable candidate"})
+            conflict = {"date": d_iso, "team": team, "role": role, "reason": "no viable candidate"}
+            if required:
+                conflict["skills_required"] = required
+            conflicts.append(conflict)
             continue
 
         # Objective sort
@@ -239,20 +625,33 @@ def propose_plan(
             viable.sort(key=lambda x: (not x["continuity"], x["wk_used"], x["mtd_used"]))
 
         chosen = viable[0]["cand_id"]
+        notes = f"Covering {role} shift due to {pto_emp_id}'s PTO."
+        if borrowed:
+            notes += f" Borrowed from {viable[0]['team']}."
         plan.append(
             {
                 "date": d_iso,
                 "team": team,
                 "role": role,
+                "start": start.isoformat() if pd.notna(start) else None,
+                "end": end.isoformat() if pd.notna(end) else None,
+                "shift_id": _shift_id(row),
+                "version": _shift_version(row),
                 "assigned_employee_id": chosen,
-                "notes": f"Covering {role} shift due to {pto_emp_id}'s PTO.",
+                "notes": notes,
             }
         )
 
         # Update usage trackers only (don’t mutate sh_df)
-        wk = _week_start(_iso_to_date(d_iso)).isoformat()
-        wk_hours[(chosen, wk)] = wk_hours.get((chosen, wk), 0) + int(hours_per_shift)
-        month_key = (chosen, f"{_iso_to_date(d_iso).year:04d}-{_iso_to_date(d_iso).month:02d}")
-        mt_hours[month_key] = mt_hours.get(month_key, 0) + int(hours_per_shift)
-
+        if pd.notna(start) and pd.notna(end):
+            index.add(chosen, start, end, d_iso, shift_hours)
+        wk_hours[(chosen, wk)] = wk_hours.get((chosen, wk), 0) + shift_hours
+        month_key = (chosen, f"{d.year:04d}-{d.month:02d}")
+        mt_hours[month_key] = mt_hours.get(month_key, 0) + shift_hours
+
+    PLAN_LATENCY.observe(time.perf_counter() - t0, objective=objective)
+    PLAN_CANDIDATES.inc(evaluated, stage="evaluated")
+    PLAN_CANDIDATES.inc(found, stage="viable")
+    PLAN_SHIFTS.inc(len(plan), outcome="covered")
+    PLAN_SHIFTS.inc(len(conflicts), outcome="conflict")
     return {"plan": plan, "conflicts": conflicts, "preview_shifts_df": target}
@@ -4,8 +4,8 @@ Seed demo data for HeraShift.
 ALWAYS clears employees + shifts and inserts fresh data.
 """
 
-from datetime import date, timedelta
-from app.db import get_db
+from datetime import date, datetime, time, timedelta
+from app.db import ensure_indexes, get_db
 
 
 def seed_demo():
@@ -30,11 +30,18 @@ def seed_demo():
     base = date.today() - timedelta(days=7)
     rows = []
     for i in range(14):
-        d = (base + timedelta(days=i)).isoformat()
-        rows.append({"date": d, "team": "team-1", "role": "engineer", "assignedEmployeeId": None})
-        rows.append({"date": d, "team": "team-2", "role": "backend",  "assignedEmployeeId": None})
-        rows.append({"date": d, "team": "team-3", "role": "devops",   "assignedEmployeeId": None})
+        day = base + timedelta(days=i)
+        d = day.isoformat()
+        day_start = datetime.combine(day, time(9)).isoformat()
+        day_end = datetime.combine(day, time(17)).isoformat()
+        # devops runs 12-hour nights
+        night_start = datetime.combine(day, time(20)).isoformat()
+        night_end = datetime.combine(day + timedelta(days=1), time(8)).isoformat()
+        rows.append({"id": f"shift-{d}-team-1", "date": d, "start": day_start, "end": day_end, "team": "team-1", "role": "engineer", "assignedEmployeeId": None, "version": 0})
+        rows.append({"id": f"shift-{d}-team-2", "date": d, "start": day_start, "end": day_end, "team": "team-2", "role": "backend",  "assignedEmployeeId": None, "version": 0})
+        rows.append({"id": f"shift-{d}-team-3", "date": d, "start": night_start, "end": night_end, "team": "team-3", "role": "devops",   "assignedEmployeeId": None, "version": 0})
     shifts.insert_many(rows)
+    ensure_indexes(db)
 
     print(f"✅ Demo data reseeded: employees=5, shifts={len(rows)}")
 
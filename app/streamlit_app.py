@@ -37,7 +37,19 @@ elif hasattr(db_mod, "get_db"):
 else:
     raise RuntimeError("app.db must export (employees, shifts) or a get_db() function.")
 
+# Dashboard loads go to secondaries when available; writes stay on EMP_COL/SHIFT_COL (primary)
+READ_DB = getattr(db_mod, "read_db", None)
+EMP_READ_COL = READ_DB["employees"] if READ_DB is not None else EMP_COL
+SHIFT_READ_COL = READ_DB["shifts"] if READ_DB is not None else SHIFT_COL
+_PTO_DB = READ_DB if READ_DB is not None else MONGO_DB
+PTO_READ_COL = _PTO_DB["pto_requests"] if _PTO_DB is not None else None
+
 from app.scheduler import propose_plan, compute_weekly_hours
+from app.roster import OBJECTIVES, generate_roster
+from app.plan_apply import apply_plan
+from app.plan_store import PlanStore
+from app.pto_worker import load_pto_index
+from app.arrow_loader import load_employees, load_shifts
 
 st.set_page_config(
     page_title="HeraShift – AI Leave & Coverage Planner",
@@ -52,64 +64,31 @@ def _env_health() -> Dict[str, Any]:
         "GEMINI_API_URL": os.getenv("GEMINI_API_URL", ""),
         "GEMINI_API_KEY?": bool(os.getenv("GEMINI_API_KEY")),
         "Mongo URI present": bool(os.getenv("MONGODB_URI")),
+        "Mongo pool": db_mod.pool_stats() if hasattr(db_mod, "pool_stats") else None,
     }
 
-def _rename_shift_columns_inplace(sh_df: pd.DataFrame) -> None:
-    rename_map = {}
-    if "assignedEmployeeId" in sh_df.columns and "assigned_id" not in sh_df.columns:
-        rename_map["assignedEmployeeId"] = "assigned_id"
-    if "assignedEmployeeName" in sh_df.columns and "assigned_name" not in sh_df.columns:
-        rename_map["assignedEmployeeName"] = "assigned_name"
-    if "teamId" in sh_df.columns and "team" not in sh_df.columns:
-        rename_map["teamId"] = "team"
-    if rename_map:
-        sh_df.rename(columns=rename_map, inplace=True)
-
 @st.cache_data(show_spinner=False)
 def _fetch_data() -> Dict[str, pd.DataFrame]:
+    """
+    Arrow-backed frames with a fixed schema (see app.arrow_loader): every column the
+    filters/UI/scheduler need exists, Mongo _id stands in for missing shift ids, and
+    `hours` stays null unless stored (scheduler derives it from start/end).
+    """
     try:
-        emps = list(EMP_COL.find({}, {"_id": 0})) if EMP_COL is not None else []
-        sh = list(SHIFT_COL.find({}, {"_id": 0})) if SHIFT_COL is not None else []
+        emp_df = load_employees(EMP_READ_COL) if EMP_READ_COL is not None else load_employees([])
+        sh_df = load_shifts(SHIFT_READ_COL) if SHIFT_READ_COL is not None else load_shifts([])
     except Exception as e:
         raise RuntimeError(
             "Failed to fetch data from MongoDB. Click 'Refresh data' after fixing the connection.\n\n"
             f"{e}"
         )
-    emp_df = pd.DataFrame(emps) if emps else pd.DataFrame(
-        columns=["id", "name", "teamId", "role", "skills", "maxHoursPerWeek"]
-    )
-    sh_df = pd.DataFrame(sh) if sh else pd.DataFrame(
-        columns=["id", "date", "team", "role", "assigned_id", "assigned_name", "hours", "skillsRequired"]
-    )
-
-    _rename_shift_columns_inplace(sh_df)
-
-    # Guarantee columns needed by filters/UI exist
-    required_cols = [
-        ("date", ""),
-        ("team", ""),
-        ("role", ""),
-        ("assigned_id", None),
-        ("assigned_name", None),
-        ("hours", 8),
-    ]
-    for col, default in required_cols:
-        if col not in sh_df.columns:
-            sh_df[col] = default
-
-    # Normalize types and NA handling
-    for c in ["id", "team", "role", "assigned_id", "assigned_name"]:
-        if c in sh_df.columns:
-            sh_df[c] = sh_df[c].astype("string").where(sh_df[c].notna(), None)
-    if "date" in sh_df.columns:
-        sh_df["date"] = sh_df["date"].astype(str)
-
-    for c in ["id", "teamId", "role", "name"]:
-        if c in emp_df.columns:
-            emp_df[c] = emp_df[c].astype("string").where(emp_df[c].notna(), None)
-
     return {"employees": emp_df, "shifts": sh_df}
 
+@st.cache_resource(show_spinner=False)
+def _plan_store() -> PlanStore:
+    col = MONGO_DB["plan_results"] if MONGO_DB is not None else None
+    return PlanStore(collection=col, max_entries=int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "256")))
+
 def _clear_cache_and_reload():
     _fetch_data.clear()
     st.toast("Reloading updated data…", icon="♻️")
@@ -202,7 +181,7 @@ with col_shift:
     if role_choice != "(all)" and "role" in show_shifts.columns:
         show_shifts = show_shifts[show_shifts["role"] == role_choice]
 
-    display_cols = [c for c in ["date", "team", "role", "assigned_id", "assigned_name"] if c in show_shifts.columns]
+    display_cols = [c for c in ["date", "start", "end", "team", "role", "skillsRequired", "assigned_id", "assigned_name"] if c in show_shifts.columns]
     st.dataframe(show_shifts[display_cols], use_container_width=True, hide_index=True)
 
 # PTO planner
@@ -232,12 +211,13 @@ else:
             with st.expander("Advanced constraints", expanded=False):
                 c1, c2, c3 = st.columns(3)
                 with c1:
-                    hours_per_shift = st.number_input("Hours per shift", 1, 24, 8, 1)
+                    hours_per_shift = st.number_input("Hours per shift (if no end time)", 1, 24, 8, 1)
                 with c2:
-                    weekly_cap = st.number_input("Max hours / week", 8, 80, int(emp_row.get("maxHoursPerWeek") or 40), 1)
+                    weekly_cap = st.number_input("Max hours / week", 8, 80, int(emp_row["maxHoursPerWeek"]) if pd.notna(emp_row.get("maxHoursPerWeek")) else 40, 1)
                 with c3:
                     min_rest_hours = st.number_input("Min rest between shifts (hrs)", 0, 24, 12, 1)
                 objective = st.selectbox("Assignment objective", ["least_overtime_risk", "fairness", "continuity", "none"], index=0)
+                allow_cross_team = st.checkbox("Borrow skilled staff from other teams if home team is exhausted", value=False)
             submitted = st.form_submit_button("Propose Coverage", type="primary")
 
     if "submitted" in locals() and submitted:
@@ -249,9 +229,22 @@ else:
                 st.caption("PTO request:")
                 st.code(json.dumps({"employee_id": selected_emp_id, "dates": cover_dates, "notes": notes}, indent=2), language="json")
 
-            result = propose_plan(
-                employees_df=emp_df,
-                shifts_df=sh_df,
+            # Approved/pending PTO overlapping the window: one indexed range query
+            team_of = dict(zip(emp_df["id"].astype(str), emp_df["teamId"].astype(str)))
+            pto_index = (
+                load_pto_index(PTO_READ_COL, start_d.isoformat(), end_d.isoformat(), team_of=team_of)
+                if PTO_READ_COL is not None else None
+            )
+            if pto_index is not None:
+                overlapping = [
+                    r for r in pto_index.overlapping(start_d, end_d, team=team_needed)
+                    if r["employeeId"] != selected_emp_id
+                ]
+                if overlapping:
+                    st.warning(f"{len(overlapping)} other PTO request(s) on {team_needed} overlap this window.", icon="📅")
+                    st.dataframe(pd.DataFrame(overlapping), use_container_width=True, hide_index=True)
+
+            plan_params = dict(
                 pto_emp_id=selected_emp_id,
                 pto_dates=cover_dates,
                 role_needed=role_needed,
@@ -260,7 +253,15 @@ else:
                 weekly_cap=int(weekly_cap),
                 hours_per_shift=int(hours_per_shift),
                 min_rest_hours=int(min_rest_hours),
+                allow_cross_team=bool(allow_cross_team),
+            )
+            result, from_cache = _plan_store().get_or_compute(
+                plan_params, emp_df, sh_df,
+                lambda: propose_plan(employees_df=emp_df, shifts_df=sh_df, pto_index=pto_index, **plan_params),
+                pto_index=pto_index,
             )
+            if from_cache:
+                st.caption("⚡ Served from plan cache (inputs and affected shifts unchanged).")
 
             plan_rows: List[Dict[str, Any]] = result["plan"]  # type: ignore
             conflicts: List[Dict[str, Any]] = result["conflicts"]  # type: ignore
@@ -296,37 +297,122 @@ else:
 
             if do_apply and plan_rows:
                 name_map = emp_df.set_index("id")["name"].to_dict()
-                applied = 0
-                for r in plan_rows:
-                    upd = {
-                        "$set": {
-                            "assignedEmployeeId": r["assigned_employee_id"],
-                            "assignedEmployeeName": name_map.get(r["assigned_employee_id"], ""),
-                        }
-                    }
-                    res = SHIFT_COL.update_one(
-                        {"date": r["date"], "team": r["team"], "role": r["role"], "assignedEmployeeId": None},
-                        upd,
+                outcome = apply_plan(
+                    SHIFT_COL,
+                    plan_rows,
+                    employee_names=name_map,
+                    weekly_cap=int(weekly_cap),
+                    hours_per_shift=int(hours_per_shift),
+                    min_rest_hours=int(min_rest_hours),
+                    employees_col=EMP_COL,
+                )
+                applied = len(outcome["applied"])
+                if applied:
+                    _plan_store().invalidate(team_needed, role_needed, cover_dates)
+                if outcome["lost"]:
+                    st.warning(
+                        f"{len(outcome['lost'])} row(s) changed underneath this plan and were not applied. "
+                        "Refresh data and propose again to re-plan them.",
+                        icon="⚠️",
                     )
-                    if res.modified_count == 0:
-                        res2 = SHIFT_COL.update_one(
-                            {"date": r["date"], "team": r["team"], "role": r["role"], "assignedEmployeeId": {"$exists": False}},
-                            upd,
-                        )
-                        applied += res2.modified_count
-                    else:
-                        applied += res.modified_count
+                    st.dataframe(pd.DataFrame(outcome["lost"]), use_container_width=True, hide_index=True)
 
                 st.success(f"Applied {applied} shift assignments.", icon="✅")
-                _clear_cache_and_reload()
+                if not outcome["lost"]:
+                    _clear_cache_and_reload()
+                else:
+                    _fetch_data.clear()
+
+# Roster generation
+st.markdown("---")
+st.header("Generate Roster")
+st.caption("Fill every open shift in the horizon for all (or selected) teams in one run.")
+
+all_teams = sorted(sh_df["team"].dropna().astype(str).unique().tolist()) if "team" in sh_df.columns else []
+with st.form("roster_form", clear_on_submit=False):
+    r1, r2, r3 = st.columns(3)
+    with r1:
+        roster_start = st.date_input("From", value=date.today(), key="roster_start")
+    with r2:
+        roster_weeks = st.number_input("Weeks", 1, 12, 2, 1)
+    with r3:
+        roster_objective = st.selectbox("Objective", list(OBJECTIVES), index=0, key="roster_objective")
+    roster_teams = st.multiselect("Teams (empty = all)", options=all_teams)
+    r4, r5 = st.columns(2)
+    with r4:
+        roster_cap = st.number_input("Max hours / week", 8, 80, 40, 1, key="roster_cap")
+    with r5:
+        roster_rest = st.number_input("Min rest between shifts (hrs)", 0, 24, 12, 1, key="roster_rest")
+    roster_cross = st.checkbox("Borrow skilled staff from other teams", value=False, key="roster_cross")
+    roster_submitted = st.form_submit_button("Generate roster", type="primary")
+
+if roster_submitted:
+    roster_end = roster_start + timedelta(days=7 * int(roster_weeks) - 1)
+    team_of = dict(zip(emp_df["id"].astype(str), emp_df["teamId"].astype(str)))
+    roster_pto = (
+        load_pto_index(PTO_READ_COL, roster_start.isoformat(), roster_end.isoformat(), team_of=team_of)
+        if PTO_READ_COL is not None else None
+    )
+    st.session_state["__roster"] = {
+        "result": generate_roster(
+            emp_df, sh_df, roster_start, roster_end,
+            teams=roster_teams or None,
+            objective=roster_objective,
+            weekly_cap=int(roster_cap),
+            min_rest_hours=int(roster_rest),
+            allow_cross_team=bool(roster_cross),
+            pto_index=roster_pto,
+        ),
+        "weekly_cap": int(roster_cap),
+        "min_rest_hours": int(roster_rest),
+    }
+
+roster_state = st.session_state.get("__roster")
+if roster_state:
+    roster = roster_state["result"]
+    stats = roster["stats"]
+    st.info(
+        f"Filled **{stats['filled']}** of {stats['open']} open shifts in {stats['seconds']}s "
+        f"(repaired {stats['repaired']}, rebalanced {stats['rebalanced']}).",
+        icon="🗓️",
+    )
+    if roster["plan"]:
+        roster_df = pd.DataFrame(roster["plan"])
+        roster_df["assigned_name"] = roster_df["assigned_employee_id"].map(emp_df.set_index("id")["name"].to_dict())
+        st.dataframe(roster_df, use_container_width=True, hide_index=True)
+    with st.expander(f"Unfilled shifts ({stats['unfilled']})", expanded=False):
+        if roster["conflicts"]:
+            st.dataframe(pd.DataFrame(roster["conflicts"]), use_container_width=True, hide_index=True)
+        else:
+            st.write("None")
+
+    if st.button("Apply roster", type="primary", disabled=not roster["plan"]):
+        outcome = apply_plan(
+            SHIFT_COL,
+            roster["plan"],
+            employee_names=emp_df.set_index("id")["name"].to_dict(),
+            weekly_cap=roster_state["weekly_cap"],
+            min_rest_hours=roster_state["min_rest_hours"],
+            employees_col=EMP_COL,
+        )
+        st.session_state.pop("__roster", None)
+        for team, role in {(r["team"], r["role"]) for r in outcome["applied"]}:
+            _plan_store().invalidate(team, role, [r["date"] for r in outcome["applied"] if (r["team"], r["role"]) == (team, role)])
+        if outcome["lost"]:
+            st.warning(f"{len(outcome['lost'])} row(s) changed underneath the roster and were not applied.", icon="⚠️")
+            st.dataframe(pd.DataFrame(outcome["lost"]), use_container_width=True, hide_index=True)
+            _fetch_data.clear()
+        else:
+            st.success(f"Applied {len(outcome['applied'])} shift assignments.", icon="✅")
+            _clear_cache_and_reload()
 
 # Weekly hours dashboard
 st.markdown("---")
 st.subheader("Weekly hours (current assignments)")
 
-wk_hours = compute_weekly_hours(sh_df, hours_per_shift=8)
+wk_hours = compute_weekly_hours(sh_df)
 if wk_hours:
-    rows = [{"week_start": wk, "employee_id": eid, "hours": hrs} for (eid, wk), hrs in wk_hours.items()]
+    rows = [{"week_start": wk, "employee_id": eid, "hours": round(hrs, 2)} for (eid, wk), hrs in wk_hours.items()]
     wk_df = pd.DataFrame(rows)
     name_map = emp_df.set_index("id")["name"].to_dict()
     cap_map = emp_df.set_index("id")["maxHoursPerWeek"].to_dict()
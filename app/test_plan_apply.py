@@ -0,0 +1,95 @@
+# app/test_plan_apply.py
+"""
+apply_plan's lost-row detection on the no-transaction path (mongomock):
+stale shift versions, caps, a concurrent coordinator double-booking the same
+employee between read and write, and the scheduleVersion lock lease.
+
+Run: python -m app.test_plan_apply   (or pytest app/test_plan_apply.py)
+"""
+from datetime import datetime, timedelta, timezone
+
+import mongomock
+
+from app import plan_apply
+
+
+def _db():
+    db = mongomock.MongoClient().db
+    db.employees.insert_many([{"id": "e1", "maxHoursPerWeek": 40}, {"id": "e2", "maxHoursPerWeek": 8}])
+    db.shifts.insert_many([
+        {"id": "s1", "date": "2025-03-03", "start": "2025-03-03T09:00:00", "end": "2025-03-03T17:00:00", "version": 0},
+        {"id": "s2", "date": "2025-03-03", "start": "2025-03-03T10:00:00", "end": "2025-03-03T18:00:00", "version": 0},
+        {"id": "s3", "date": "2025-03-04", "start": "2025-03-04T09:00:00", "end": "2025-03-04T17:00:00", "version": 0},
+    ])
+    return db
+
+
+def _row(shift_id, emp, version=0):
+    return {"shift_id": shift_id, "date": "2025-03-0" + ("4" if shift_id == "s3" else "3"), "assigned_employee_id": emp, "version": version}
+
+
+def _apply(db, rows):
+    return plan_apply.apply_plan(db.shifts, rows, use_transaction=False)
+
+
+def _reasons(out):
+    return [r["reason"] for r in out["lost"]]
+
+
+def test_stale_shift_version_and_unknown_employee():
+    db = _db()
+    out = _apply(db, [_row("s1", "e1", version=3), _row("s3", "nobody"), {"date": "2025-03-03", "assigned_employee_id": "e1"}])
+    assert out["applied"] == []
+    assert sorted(_reasons(out)) == ["employee not found", "shift changed since planning", "shift has no id"]
+
+
+def test_weekly_cap_and_double_booking_in_one_plan():
+    db = _db()
+    out = _apply(db, [_row("s1", "e2"), _row("s3", "e2")])  # e2's cap is 8h: only one fits
+    assert len(out["applied"]) == 1 and _reasons(out) == ["weekly cap exceeded"]
+    out = _apply(db, [_row("s2", "e2")])  # overlaps s1 or breaks the cap with s3, whichever e2 got
+    assert _reasons(out) and db.shifts.find_one({"id": "s2"}).get("assignedEmployeeId") is None
+
+
+def test_concurrent_coordinator_on_another_shift_wins_the_employee():
+    db = _db()
+    validate, fired = plan_apply._validate, []
+
+    def racing(*args, **kwargs):
+        # B books e1 on the overlapping s2 after A has read its state
+        if not fired:
+            fired.append(None)
+            fired[0] = _apply(db, [_row("s2", "e1")])
+        return validate(*args, **kwargs)
+
+    plan_apply._validate = racing
+    try:
+        out = _apply(db, [_row("s1", "e1")])
+    finally:
+        plan_apply._validate = validate
+    assert len(fired[0]["applied"]) == 1
+    assert out["applied"] == [] and _reasons(out) == ["employee schedule changed since planning"]
+    assert db.shifts.find_one({"id": "s1"}).get("assignedEmployeeId") is None
+    assert db.employees.find_one({"id": "e1"})["scheduleVersion"] % 2 == 0  # released
+
+
+def test_lock_lease():
+    db = _db()
+    now = datetime.now(timezone.utc)
+    db.employees.update_one({"id": "e1"}, {"$set": {"scheduleVersion": 3, "scheduleLockedAt": now}})
+    assert _reasons(_apply(db, [_row("s1", "e1")])) == ["employee schedule is being updated"]
+
+    stale = now - timedelta(seconds=plan_apply.APPLY_LOCK_LEASE_S + 1)
+    db.employees.update_one({"id": "e1"}, {"$set": {"scheduleLockedAt": stale}})
+    out = _apply(db, [_row("s1", "e1")])
+    assert len(out["applied"]) == 1 and out["lost"] == []
+    emp = db.employees.find_one({"id": "e1"})
+    assert emp["scheduleVersion"] % 2 == 0 and "scheduleLockToken" not in emp
+
+
+if __name__ == "__main__":
+    test_stale_shift_version_and_unknown_employee()
+    test_weekly_cap_and_double_booking_in_one_plan()
+    test_concurrent_coordinator_on_another_shift_wins_the_employee()
+    test_lock_lease()
+    print("ok")
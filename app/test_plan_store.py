@@ -0,0 +1,79 @@
+# app/test_plan_store.py
+"""
+PlanStore with frames shaped like the app's (arrow_loader output) and a
+mongomock collection: digest, BSON round trip, cache hit / invalidation.
+
+Run: python -m app.test_plan_store   (or pytest app/test_plan_store.py)
+"""
+from datetime import datetime, timedelta
+
+import bson
+import mongomock
+
+from app.arrow_loader import load_employees, load_shifts
+from app.plan_store import PlanStore
+from app.scheduler import propose_plan
+
+BASE = datetime(2025, 3, 3, 9)
+PARAMS = dict(pto_emp_id="emp-0", pto_dates=["2025-03-05", "2025-03-07"], role_needed="nurse", team_needed="team-1")
+
+
+def _employees():
+    return load_employees([
+        {"id": f"emp-{i}", "name": f"E{i}", "teamId": "team-1", "role": "nurse", "skills": ["icu", "er"], "maxHoursPerWeek": 40}
+        for i in range(4)
+    ])
+
+
+def _shift_docs(days=10, team="team-1"):
+    return [
+        {
+            "id": f"{team}-shift-{i}", "date": (BASE + timedelta(days=i)).date().isoformat(),
+            "start": BASE + timedelta(days=i), "end": BASE + timedelta(days=i, hours=8),
+            "team": team, "role": "nurse", "assignedEmployeeId": "emp-0" if i % 2 == 0 else None,
+            "skillsRequired": ["icu"], "version": 0,
+        }
+        for i in range(days)
+    ]
+
+
+def _plan(store, emp_df, sh_df):
+    return store.get_or_compute(PARAMS, emp_df, sh_df, lambda: propose_plan(employees_df=emp_df, shifts_df=sh_df, **PARAMS))
+
+
+def test_arrow_frames_round_trip_through_mongo():
+    emp_df, sh_df = _employees(), load_shifts(_shift_docs())
+    store = PlanStore(collection=mongomock.MongoClient().db["plan_cache"])
+
+    result, hit = _plan(store, emp_df, sh_df)
+    assert not hit and result["plan"]
+    bson.encode({"result": PlanStore._dump(result)})  # list cells / numpy scalars must be BSON-able
+
+    store._lru.clear()  # serve the second call from the Mongo copy
+    cached, hit = _plan(store, emp_df, sh_df)
+    assert hit and cached["plan"] == result["plan"]
+    assert list(cached["preview_shifts_df"]["skillsRequired"].iloc[0]) == ["icu"]
+
+
+def test_key_follows_the_data_the_plan_reads():
+    emp_df = _employees()
+    docs = _shift_docs() + _shift_docs(team="team-9")
+    store = PlanStore()
+    _plan(store, emp_df, load_shifts(docs))
+
+    # Another team's shift with no candidate on it: still a hit
+    elsewhere = [dict(d, version=5) if d["id"] == "team-9-shift-3" else d for d in docs]
+    assert _plan(store, emp_df, load_shifts(elsewhere))[1]
+
+    # A skills change on a shift in the window: miss
+    changed = [dict(d, skillsRequired=["er"]) if d["id"] == "team-1-shift-3" else d for d in docs]
+    assert not _plan(store, emp_df, load_shifts(changed))[1]
+
+    store.invalidate("team-1", "nurse", PARAMS["pto_dates"])
+    assert not _plan(store, emp_df, load_shifts(docs))[1]
+
+
+if __name__ == "__main__":
+    test_arrow_frames_round_trip_through_mongo()
+    test_key_follows_the_data_the_plan_reads()
+    print("ok")
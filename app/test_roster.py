@@ -0,0 +1,135 @@
+# app/test_roster.py
+"""
+generate_roster invariants on a small multi-week roster: only open shifts
+are filled, and every new assignment respects role/team, skills, approved
+PTO, min rest and weekly caps (employee maxHoursPerWeek and weekly_cap).
+
+Run: python -m app.test_roster   (or pytest app/test_roster.py)
+"""
+import random
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from app.roster import generate_roster
+from app.scheduler import PTOIntervalIndex, _week_start
+
+START = date(2025, 3, 3)
+WEEKS = 4
+TEAMS = ["team-1", "team-2", "team-3"]
+ROLES = ["nurse", "engineer"]
+SKILLS = ["icu", "er", "peds"]
+
+
+def _employees():
+    rng = random.Random(3)
+    rows = []
+    for i in range(18):  # 3 per team/role: under-staffed, so caps and rest bind
+        rows.append({
+            "id": f"emp-{i:02d}", "name": f"E{i}", "teamId": TEAMS[i % 3], "role": ROLES[(i // 3) % 2],
+            "skills": rng.sample(SKILLS, 2), "maxHoursPerWeek": 24 if i % 5 == 0 else 40,
+        })
+    return pd.DataFrame(rows)
+
+
+def _shifts(emp_df):
+    """Day (09-17) and night (20-08) shifts per team/role; some pre-assigned, some needing a skill."""
+    rng = random.Random(11)
+    rows = []
+    for d in range(7 * WEEKS):
+        day = START + timedelta(days=d)
+        for team in TEAMS:
+            for role in ROLES:
+                staff = emp_df[(emp_df["teamId"] == team) & (emp_df["role"] == role)]["id"].tolist()
+                for kind, hour, length in (("day", 9, 8), ("night", 20, 12)):
+                    start = datetime.combine(day, datetime.min.time()) + timedelta(hours=hour)
+                    # Existing assignments: one fixed person per team/role on Monday days only (no rest clashes)
+                    assigned = staff[0] if kind == "day" and day.weekday() == 0 else None
+                    rows.append({
+                        "id": f"{team}-{role}-{day.isoformat()}-{kind}", "date": day.isoformat(),
+                        "start": start.isoformat(), "end": (start + timedelta(hours=length)).isoformat(),
+                        "team": team, "role": role, "assignedEmployeeId": assigned, "version": 0,
+                        "skillsRequired": [rng.choice(SKILLS)] if rng.random() < 0.25 else [],
+                    })
+    return pd.DataFrame(rows)
+
+
+def _pto(emp_df):
+    team_of = dict(zip(emp_df["id"], emp_df["teamId"]))
+    return PTOIntervalIndex.from_requests(
+        [
+            {"id": "p1", "employeeId": "emp-01", "start": "2025-03-05", "end": "2025-03-14", "status": "approved"},
+            {"id": "p2", "employeeId": "emp-04", "start": "2025-03-10", "end": "2025-03-10", "status": "approved"},
+            {"id": "p3", "employeeId": "emp-07", "start": "2025-03-03", "end": "2025-03-30", "status": "pending"},
+        ],
+        team_of=team_of,
+    )
+
+
+def _check_invariants(result, emp_df, sh_df, pto, weekly_cap, min_rest_hours, teams=None):
+    shifts = sh_df.set_index("id")
+    emp = emp_df.set_index("id")
+    plan = result["plan"]
+    ids = [p["shift_id"] for p in plan]
+    assert len(ids) == len(set(ids))
+    assert result["stats"]["filled"] == len(plan) and result["stats"]["unfilled"] == len(result["conflicts"])
+
+    booked = defaultdict(list)  # employee -> [(start, end, new)]
+    for sid, row in shifts[shifts["assignedEmployeeId"].notna()].iterrows():
+        booked[row["assignedEmployeeId"]].append((pd.Timestamp(row["start"]), pd.Timestamp(row["end"]), False))
+
+    for p in plan:
+        shift, who = shifts.loc[p["shift_id"]], p["assigned_employee_id"]
+        assert pd.isna(shift["assignedEmployeeId"]), "only open shifts are rostered"
+        assert teams is None or shift["team"] in teams
+        assert emp.loc[who, "role"] == shift["role"] and emp.loc[who, "teamId"] == shift["team"]
+        assert set(shift["skillsRequired"]) <= set(emp.loc[who, "skills"])
+        assert who not in pto.out_on(shift["date"], team=shift["team"]), "approved PTO"
+        booked[who].append((pd.Timestamp(shift["start"]), pd.Timestamp(shift["end"]), True))
+
+    rest = pd.Timedelta(hours=min_rest_hours)
+    for who, spans in booked.items():
+        spans.sort()
+        for (s0, e0, new0), (s1, e1, new1) in zip(spans, spans[1:]):
+            assert not (new0 or new1) or s1 - e0 >= rest, f"{who} rest {s1 - e0}"
+        cap = min(weekly_cap, int(emp.loc[who, "maxHoursPerWeek"]))
+        weekly = defaultdict(float)
+        for s, e, new in spans:
+            weekly[_week_start(s.date())] += (e - s) / pd.Timedelta(hours=1)
+        for week, hours in weekly.items():
+            if any(new and _week_start(s.date()) == week for s, e, new in spans):
+                assert hours <= cap, f"{who} {hours}h in week of {week}"
+
+
+def test_roster_respects_constraints():
+    emp_df = _employees()
+    sh_df = _shifts(emp_df)
+    pto = _pto(emp_df)
+    end = START + timedelta(days=7 * WEEKS - 1)
+    for objective in ("least_overtime_risk", "fairness", "continuity", "none"):
+        for improve in (False, True):
+            result = generate_roster(
+                emp_df, sh_df, START, end, objective=objective, weekly_cap=40, min_rest_hours=12,
+                pto_index=pto, improve=improve,
+            )
+            assert result["plan"]
+            _check_invariants(result, emp_df, sh_df, pto, weekly_cap=40, min_rest_hours=12)
+
+
+def test_roster_team_filter_and_window():
+    emp_df = _employees()
+    sh_df = _shifts(emp_df)
+    pto = _pto(emp_df)
+    result = generate_roster(
+        emp_df, sh_df, "2025-03-10", "2025-03-16", teams=["team-2"], weekly_cap=32, min_rest_hours=12, pto_index=pto
+    )
+    assert {p["team"] for p in result["plan"] + result["conflicts"]} == {"team-2"}
+    assert all("2025-03-10" <= p["date"] <= "2025-03-16" for p in result["plan"] + result["conflicts"])
+    _check_invariants(result, emp_df, sh_df, pto, weekly_cap=32, min_rest_hours=12, teams={"team-2"})
+
+
+if __name__ == "__main__":
+    test_roster_respects_constraints()
+    test_roster_team_filter_and_window()
+    print("ok")
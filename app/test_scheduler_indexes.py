@@ -0,0 +1,138 @@
+# app/test_scheduler_indexes.py
+"""
+ShiftIntervalIndex and PTOIntervalIndex against brute force, plus approved
+PTO exclusion and PTO date handling in propose_plan.
+
+Run: python -m app.test_scheduler_indexes   (or pytest app/test_scheduler_indexes.py)
+"""
+import random
+from datetime import date, timedelta
+
+import pandas as pd
+
+from app.scheduler import PTOIntervalIndex, ShiftIntervalIndex, propose_plan
+
+T0 = pd.Timestamp("2025-01-01")
+
+
+def _at(hours: float) -> pd.Timestamp:
+    return T0 + pd.Timedelta(hours=hours)
+
+
+def test_shift_index_matches_brute_force():
+    rng = random.Random(0)
+    index, held = ShiftIntervalIndex(), []
+    for _ in range(3000):
+        if held and rng.random() < 0.3:
+            a, b = held.pop(rng.randrange(len(held)))
+            index.remove("e", _at(a), _at(b), "d", 0)
+        else:
+            a = rng.uniform(0, 500)
+            b = a + rng.choice([rng.uniform(0.5, 12), rng.uniform(24, 72)])  # some long shifts
+            held.append((a, b))
+            index.add("e", _at(a), _at(b), "d", 0)
+        qa, rest = rng.uniform(0, 500), rng.choice([0, 12])
+        qb = qa + rng.uniform(0.5, 10)
+        expected = any(a < qb + rest and b > qa - rest for a, b in held)
+        assert index.conflicts("e", _at(qa), _at(qb), rest) == expected
+
+
+def test_shift_index_long_earlier_shift_on_double_booked_data():
+    df = pd.DataFrame({
+        "assigned_id": ["e", "e"], "start": [_at(8), _at(9)], "end": [_at(20), _at(10)],
+        "date": ["2025-01-01"] * 2, "hours": [12, 1],
+    })
+    # The 08-20 shift covers 14-16 even though the latest start before it ends at 10
+    assert ShiftIntervalIndex.from_shifts(df).conflicts("e", _at(14), _at(16))
+
+
+def _request(rng: random.Random, i: int):
+    s = date(2025, 1, 1) + timedelta(days=rng.randrange(365))
+    e = s + timedelta(days=rng.choice([0, 1, 3, 14, 200]))  # a few very long requests
+    return {
+        "id": f"r{i}", "employeeId": f"e{i % 50}", "teamId": f"t{i % 3}",
+        "start": s.isoformat(), "end": e.isoformat(), "status": rng.choice(["approved", "pending"]),
+    }
+
+
+def test_pto_index_matches_brute_force():
+    rng = random.Random(7)
+    reqs = [_request(rng, i) for i in range(2000)]
+    index = PTOIntervalIndex.from_requests(reqs[:1500])
+    for r in reqs[1500:]:
+        index.add(r)  # after the trees are built
+    for _ in range(2000):
+        lo = date(2024, 12, 1) + timedelta(days=rng.randrange(420))
+        hi = lo + timedelta(days=rng.randrange(20))
+        team, statuses = rng.choice([None, "t0", "t2"]), rng.choice([None, ("approved",)])
+        got = sorted(r["id"] for r in index.overlapping(lo.isoformat(), hi.isoformat(), team=team, statuses=statuses))
+        expected = sorted(
+            r["id"] for r in reqs
+            if r["start"] <= hi.isoformat() and r["end"] >= lo.isoformat()
+            and (team is None or r["teamId"] == team) and (statuses is None or r["status"] in statuses)
+        )
+        assert got == expected
+
+
+def test_pto_index_placement():
+    index = PTOIntervalIndex.from_requests(
+        [
+            {"id": "a", "employeeId": "e1", "start": "2025-03-04", "end": "2025-03-05", "status": "approved"},
+            {"id": "b", "employeeId": "nobody", "start": "2025-03-04", "end": "2025-03-05"},
+            {"id": "c", "employeeId": "e1", "teamId": "t1", "start": "2025-03-05", "end": "2025-03-04"},
+        ],
+        team_of={"e1": "t1"},
+    )
+    assert index.out_on("2025-03-05", team="t1") == {"e1"}
+    assert index.out_on("2025-03-06", team="t1") == set()
+    assert [r["id"] for r in index.overlapping("2025-01-01", "2025-12-31")] == ["a"]
+
+
+def test_planner_skips_employees_on_approved_pto():
+    emp = pd.DataFrame([
+        {"id": f"e{i}", "name": str(i), "teamId": "t1", "role": "eng", "skills": [], "maxHoursPerWeek": 40} for i in range(4)
+    ])
+    sh = pd.DataFrame([
+        {"id": f"s{d}", "date": f"2025-03-0{d}", "team": "t1", "role": "eng", "assignedEmployeeId": "e0"} for d in range(3, 8)
+    ])
+    kwargs = dict(
+        employees_df=emp, shifts_df=sh, pto_emp_id="e0", pto_dates=[f"2025-03-0{d}" for d in range(3, 8)],
+        role_needed="eng", team_needed="t1", objective="none",
+    )
+    assert {p["assigned_employee_id"] for p in propose_plan(**kwargs)["plan"]} == {"e1"}
+
+    pto = PTOIntervalIndex.from_requests(
+        [
+            {"id": "a", "employeeId": "e1", "start": "2025-03-04", "end": "2025-03-05", "status": "approved"},
+            {"id": "b", "employeeId": "e2", "start": "2025-03-01", "end": "2025-03-09", "status": "pending"},
+        ],
+        team_of={"e1": "t1", "e2": "t1"},
+    )
+    plan = {p["date"]: p["assigned_employee_id"] for p in propose_plan(**kwargs, pto_index=pto)["plan"]}
+    assert len(plan) == 5
+    assert plan["2025-03-04"] != "e1" and plan["2025-03-05"] != "e1"  # approved leave excluded, pending is not
+
+
+def test_planner_reports_invalid_pto_dates():
+    emp = pd.DataFrame([
+        {"id": f"e{i}", "name": str(i), "teamId": "t1", "role": "eng", "skills": [], "maxHoursPerWeek": 40} for i in range(3)
+    ])
+    sh = pd.DataFrame([
+        {"id": f"s{d}", "date": f"2025-03-0{d}", "team": "t1", "role": "eng", "assignedEmployeeId": "e0"} for d in range(3, 8)
+    ])
+    result = propose_plan(
+        employees_df=emp, shifts_df=sh, pto_emp_id="e0", pto_dates=["2025-03-04", "bogus", "2025-03-06"],
+        role_needed="eng", team_needed="t1",
+    )
+    assert [p["date"] for p in result["plan"]] == ["2025-03-04", "2025-03-06"]
+    assert result["conflicts"] == [{"date": "bogus", "team": "t1", "role": "eng", "reason": "invalid date"}]
+
+
+if __name__ == "__main__":
+    test_shift_index_matches_brute_force()
+    test_shift_index_long_earlier_shift_on_double_booked_data()
+    test_pto_index_matches_brute_force()
+    test_pto_index_placement()
+    test_planner_skips_employees_on_approved_pto()
+    test_planner_reports_invalid_pto_dates()
+    print("ok")